@@ -1,19 +1,166 @@
+import heapq
 import itertools
+import multiprocessing
+import os
+import weakref
+
+# Subexpressions of compiled sentences nested deeper than this are
+# computed into a variable first, as Python limits how deeply an
+# expression can nest
+COMPILE_DEPTH = 20
 
 
 class Sentence():
+    """
+    Logical sentences are immutable and hash-consed: constructing a
+    sentence equal to a live one returns that same object, so equality
+    is identity and hashes and symbol sets are computed only once.
+    """
+
+    __slots__ = ("_hash", "_symbols", "_compiled", "__weakref__")
+
+    # All live sentences, keyed by their class and fields
+    interned = weakref.WeakValueDictionary()
+
+    @classmethod
+    def intern(cls, *fields):
+        """Returns the unique sentence of this class with the given fields."""
+        key = (cls, *fields)
+        sentence = Sentence.interned.get(key)
+        if sentence is None:
+            sentence = object.__new__(cls)
+            for name, value in zip(cls.__slots__, fields):
+                object.__setattr__(sentence, name, value)
+            object.__setattr__(sentence, "_hash", hash(key))
+            object.__setattr__(sentence, "_symbols",
+                               sentence.collect_symbols())
+            Sentence.interned[key] = sentence
+        return sentence
+
+    def __setattr__(self, name, value):
+        raise AttributeError("logical sentences are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("logical sentences are immutable")
+
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return (type(self), self.fields())
+
+    def fields(self):
+        """Returns the arguments the sentence was constructed from."""
+        return tuple(getattr(self, name) for name in type(self).__slots__)
+
+    def collect_symbols(self):
+        """Computes the set of symbols, used once when the sentence is built."""
+        return frozenset()
 
     def evaluate(self, model):
         """Evaluates the logical sentence."""
         raise Exception("nothing to evaluate")
 
+    def evaluate_partial(self, model):
+        """
+        Evaluates the logical sentence under a model that may leave some
+        symbols unassigned, returning None if the value is not yet known.
+        """
+        raise Exception("nothing to evaluate")
+
     def formula(self):
         """Returns string formula representing logical sentence."""
         return ""
 
     def symbols(self):
         """Returns a set of all symbols in the logical sentence."""
-        return set()
+        return self._symbols
+
+    def operands(self):
+        """Returns the sentences the sentence was constructed from."""
+        return [field for field in self.fields()
+                if isinstance(field, Sentence)]
+
+    def expression(self, operands, index):
+        """
+        Returns a Python expression evaluating the sentence over a
+        boolean vector `v`, given the expressions of its operands, where
+        `index` maps symbol names to positions.
+        """
+        raise Exception("nothing to compile")
+
+    def compile(self, symbols=None):
+        """
+        Compiles the sentence into a function of a positional boolean vector.
+
+        `symbols` gives the order of the vector's positions and defaults to
+        the sentence's symbols in sorted order; it is also available as the
+        `symbols` attribute of the returned function. Compiled functions are
+        cached per sentence and symbol order, and fall back to evaluate if
+        Python cannot compile the generated code.
+        """
+        if symbols is None:
+            symbols = sorted(self.symbols())
+        symbols = tuple(symbols)
+        cache = getattr(self, "_compiled", None)
+        if cache is None:
+            cache = dict()
+            object.__setattr__(self, "_compiled", cache)
+        if symbols not in cache:
+            index = {symbol: i for i, symbol in enumerate(symbols)}
+            missing = self.symbols().difference(index)
+            if missing:
+                raise Exception(f"variable {min(missing)} not in symbols")
+            lines = ["def function(v):"]
+            expressions = dict()
+            stack = [(self, False)]
+            while stack:
+                sentence, expanded = stack.pop()
+                if sentence in expressions:
+                    continue
+                operands = sentence.operands()
+                if not expanded:
+                    stack.append((sentence, True))
+                    stack.extend((operand, False) for operand in operands)
+                    continue
+
+                # Each expression is kept with how deeply it nests
+                expression = sentence.expression(
+                    [expressions[operand][0] for operand in operands], index
+                )
+                depth = 1 + max(
+                    (expressions[operand][1] for operand in operands),
+                    default=0
+                )
+                if depth > COMPILE_DEPTH:
+                    name = f"t{len(lines)}"
+                    lines.append(f"    {name} = {expression}")
+                    expression, depth = name, 0
+                expressions[sentence] = (expression, depth)
+            lines.append(f"    return bool({expressions[self][0]})")
+
+            # Python may still refuse code that is too large, in which
+            # case the function evaluates the sentence instead
+            namespace = {"__builtins__": {"bool": bool}}
+            try:
+                exec("\n".join(lines), namespace)
+                function = namespace["function"]
+            except (SyntaxError, RecursionError, MemoryError):
+                def function(v):
+                    return self.evaluate(dict(zip(symbols, v)))
+            function.symbols = symbols
+            cache[symbols] = function
+        return cache[symbols]
+
+    def vectorize(self, columns):
+        """
+        Evaluates the sentence over many models at once, where `columns`
+        maps symbol names to bit-packed NumPy arrays of their values.
+        """
+        raise Exception("nothing to vectorize")
 
     @classmethod
     def validate(cls, sentence):
@@ -43,15 +190,10 @@ class Sentence():
 
 
 class Symbol(Sentence):
+    __slots__ = ("name",)
 
-    def __init__(self, name):
-        self.name = name
-
-    def __eq__(self, other):
-        return isinstance(other, Symbol) and self.name == other.name
-
-    def __hash__(self):
-        return hash(("symbol", self.name))
+    def __new__(cls, name):
+        return cls.intern(name)
 
     def __repr__(self):
         return self.name
@@ -62,23 +204,32 @@ class Symbol(Sentence):
         except KeyError:
             raise Exception(f"variable {self.name} not in model")
 
+    def evaluate_partial(self, model):
+        value = model.get(self.name)
+        return None if value is None else bool(value)
+
     def formula(self):
         return self.name
 
-    def symbols(self):
-        return {self.name}
+    def collect_symbols(self):
+        return frozenset((self.name,))
 
+    def expression(self, operands, index):
+        return f"v[{index[self.name]}]"
 
-class Not(Sentence):
-    def __init__(self, operand):
-        Sentence.validate(operand)
-        self.operand = operand
+    def vectorize(self, columns):
+        try:
+            return columns[self.name]
+        except KeyError:
+            raise Exception(f"variable {self.name} not in model")
 
-    def __eq__(self, other):
-        return isinstance(other, Not) and self.operand == other.operand
 
-    def __hash__(self):
-        return hash(("not", hash(self.operand)))
+class Not(Sentence):
+    __slots__ = ("operand",)
+
+    def __new__(cls, operand):
+        Sentence.validate(operand)
+        return cls.intern(operand)
 
     def __repr__(self):
         return f"Not({self.operand})"
@@ -86,26 +237,38 @@ class Not(Sentence):
     def evaluate(self, model):
         return not self.operand.evaluate(model)
 
+    def evaluate_partial(self, model):
+        value = self.operand.evaluate_partial(model)
+        return None if value is None else not value
+
     def formula(self):
         return "¬" + Sentence.parenthesize(self.operand.formula())
 
-    def symbols(self):
+    def collect_symbols(self):
         return self.operand.symbols()
 
+    def expression(self, operands, index):
+        return f"(not {operands[0]})"
+
+    def vectorize(self, columns):
+        return ~self.operand.vectorize(columns)
+
 
 class And(Sentence):
-    def __init__(self, *conjuncts):
+    __slots__ = ("conjuncts",)
+
+    def __new__(cls, *conjuncts):
+        flattened = []
         for conjunct in conjuncts:
             Sentence.validate(conjunct)
-        self.conjuncts = list(conjuncts)
-
-    def __eq__(self, other):
-        return isinstance(other, And) and self.conjuncts == other.conjuncts
+            if isinstance(conjunct, And):
+                flattened.extend(conjunct.conjuncts)
+            else:
+                flattened.append(conjunct)
+        return cls.intern(tuple(flattened))
 
-    def __hash__(self):
-        return hash(
-            ("and", tuple(hash(conjunct) for conjunct in self.conjuncts))
-        )
+    def fields(self):
+        return self.conjuncts
 
     def __repr__(self):
         conjunctions = ", ".join(
@@ -114,35 +277,65 @@ class And(Sentence):
         return f"And({conjunctions})"
 
     def add(self, conjunct):
-        Sentence.validate(conjunct)
-        self.conjuncts.append(conjunct)
+        """
+        Sentences are immutable, so a conjunct cannot be added in place.
+        Use And(knowledge, conjunct), or a KnowledgeBase, instead.
+        """
+        raise AttributeError(
+            "logical sentences are immutable, use And(knowledge, conjunct)"
+        )
 
     def evaluate(self, model):
         return all(conjunct.evaluate(model) for conjunct in self.conjuncts)
 
+    def evaluate_partial(self, model):
+        result = True
+        for conjunct in self.conjuncts:
+            value = conjunct.evaluate_partial(model)
+            if value is False:
+                return False
+            if value is None:
+                result = None
+        return result
+
     def formula(self):
         if len(self.conjuncts) == 1:
             return self.conjuncts[0].formula()
         return " ∧ ".join([Sentence.parenthesize(conjunct.formula())
                            for conjunct in self.conjuncts])
 
-    def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
+    def collect_symbols(self):
+        return frozenset().union(
+            *[conjunct.symbols() for conjunct in self.conjuncts]
+        )
+
+    def expression(self, operands, index):
+        if not operands:
+            return "True"
+        return "(" + " and ".join(operands) + ")"
+
+    def vectorize(self, columns):
+        result = ~(columns[None] & 0)
+        for conjunct in self.conjuncts:
+            result &= conjunct.vectorize(columns)
+        return result
 
 
 class Or(Sentence):
-    def __init__(self, *disjuncts):
+    __slots__ = ("disjuncts",)
+
+    def __new__(cls, *disjuncts):
+        flattened = []
         for disjunct in disjuncts:
             Sentence.validate(disjunct)
-        self.disjuncts = list(disjuncts)
-
-    def __eq__(self, other):
-        return isinstance(other, Or) and self.disjuncts == other.disjuncts
+            if isinstance(disjunct, Or):
+                flattened.extend(disjunct.disjuncts)
+            else:
+                flattened.append(disjunct)
+        return cls.intern(tuple(flattened))
 
-    def __hash__(self):
-        return hash(
-            ("or", tuple(hash(disjunct) for disjunct in self.disjuncts))
-        )
+    def fields(self):
+        return self.disjuncts
 
     def __repr__(self):
         disjuncts = ", ".join([str(disjunct) for disjunct in self.disjuncts])
@@ -151,30 +344,46 @@ class Or(Sentence):
     def evaluate(self, model):
         return any(disjunct.evaluate(model) for disjunct in self.disjuncts)
 
+    def evaluate_partial(self, model):
+        result = False
+        for disjunct in self.disjuncts:
+            value = disjunct.evaluate_partial(model)
+            if value is True:
+                return True
+            if value is None:
+                result = None
+        return result
+
     def formula(self):
         if len(self.disjuncts) == 1:
             return self.disjuncts[0].formula()
         return " ∨  ".join([Sentence.parenthesize(disjunct.formula())
                             for disjunct in self.disjuncts])
 
-    def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
+    def collect_symbols(self):
+        return frozenset().union(
+            *[disjunct.symbols() for disjunct in self.disjuncts]
+        )
+
+    def expression(self, operands, index):
+        if not operands:
+            return "False"
+        return "(" + " or ".join(operands) + ")"
+
+    def vectorize(self, columns):
+        result = columns[None] & 0
+        for disjunct in self.disjuncts:
+            result |= disjunct.vectorize(columns)
+        return result
 
 
 class Implication(Sentence):
-    def __init__(self, antecedent, consequent):
+    __slots__ = ("antecedent", "consequent")
+
+    def __new__(cls, antecedent, consequent):
         Sentence.validate(antecedent)
         Sentence.validate(consequent)
-        self.antecedent = antecedent
-        self.consequent = consequent
-
-    def __eq__(self, other):
-        return (isinstance(other, Implication)
-                and self.antecedent == other.antecedent
-                and self.consequent == other.consequent)
-
-    def __hash__(self):
-        return hash(("implies", hash(self.antecedent), hash(self.consequent)))
+        return cls.intern(antecedent, consequent)
 
     def __repr__(self):
         return f"Implication({self.antecedent}, {self.consequent})"
@@ -183,29 +392,41 @@ class Implication(Sentence):
         return ((not self.antecedent.evaluate(model))
                 or self.consequent.evaluate(model))
 
+    def evaluate_partial(self, model):
+        antecedent = self.antecedent.evaluate_partial(model)
+        if antecedent is False:
+            return True
+        consequent = self.consequent.evaluate_partial(model)
+        if consequent is True:
+            return True
+        if antecedent is None or consequent is None:
+            return None
+        return False
+
     def formula(self):
         antecedent = Sentence.parenthesize(self.antecedent.formula())
         consequent = Sentence.parenthesize(self.consequent.formula())
         return f"{antecedent} => {consequent}"
 
-    def symbols(self):
-        return set.union(self.antecedent.symbols(), self.consequent.symbols())
+    def collect_symbols(self):
+        return self.antecedent.symbols() | self.consequent.symbols()
+
+    def expression(self, operands, index):
+        antecedent, consequent = operands
+        return f"((not {antecedent}) or {consequent})"
+
+    def vectorize(self, columns):
+        return (~self.antecedent.vectorize(columns)
+                | self.consequent.vectorize(columns))
 
 
 class Biconditional(Sentence):
-    def __init__(self, left, right):
+    __slots__ = ("left", "right")
+
+    def __new__(cls, left, right):
         Sentence.validate(left)
         Sentence.validate(right)
-        self.left = left
-        self.right = right
-
-    def __eq__(self, other):
-        return (isinstance(other, Biconditional)
-                and self.left == other.left
-                and self.right == other.right)
-
-    def __hash__(self):
-        return hash(("biconditional", hash(self.left), hash(self.right)))
+        return cls.intern(left, right)
 
     def __repr__(self):
         return f"Biconditional({self.left}, {self.right})"
@@ -216,48 +437,952 @@ class Biconditional(Sentence):
                 or (not self.left.evaluate(model)
                     and not self.right.evaluate(model)))
 
+    def evaluate_partial(self, model):
+        left = self.left.evaluate_partial(model)
+        if left is None:
+            return None
+        right = self.right.evaluate_partial(model)
+        if right is None:
+            return None
+        return left == right
+
     def formula(self):
         left = Sentence.parenthesize(str(self.left))
         right = Sentence.parenthesize(str(self.right))
         return f"{left} <=> {right}"
 
-    def symbols(self):
-        return set.union(self.left.symbols(), self.right.symbols())
+    def collect_symbols(self):
+        return self.left.symbols() | self.right.symbols()
+
+    def expression(self, operands, index):
+        left, right = operands
+        return f"((not {left}) == (not {right}))"
+
+    def vectorize(self, columns):
+        return ~(self.left.vectorize(columns) ^ self.right.vectorize(columns))
+
+
+def symbol_occurrences(sentence, counts=None):
+    """Counts how many times each symbol occurs in a sentence."""
+    if counts is None:
+        counts = dict()
+    if isinstance(sentence, Symbol):
+        counts[sentence.name] = counts.get(sentence.name, 0) + 1
+    else:
+        for operand in sentence.fields():
+            symbol_occurrences(operand, counts)
+    return counts
+
+
+# Subtrees of check_all with at most this many unassigned symbols are
+# enumerated with compiled sentences rather than evaluated partially
+LEAF_SYMBOLS = 10
+
+
+def check_all(knowledge, query, symbols, model):
+    """
+    Checks if knowledge base entails query, given a partial model that
+    assigns the first len(model) of `symbols`.
+    """
+
+    # If knowledge base is already false, every completion is fine
+    knowledge_value = knowledge.evaluate_partial(model)
+    if knowledge_value is False:
+        return True
+
+    # If query is already true, knowledge base implies it everywhere
+    query_value = query.evaluate_partial(model)
+    if query_value is True:
+        return True
+
+    # If knowledge base is true and query false, entailment fails
+    if knowledge_value is True and query_value is False:
+        return False
+
+    # With few symbols left, partial evaluation rarely prunes anything,
+    # so check every completion with the compiled sentences instead
+    if len(symbols) - len(model) <= LEAF_SYMBOLS:
+        knowledge = knowledge.compile(symbols)
+        query = query.compile(symbols)
+        assigned = tuple(model[p] for p in symbols[:len(model)])
+        for rest in itertools.product(
+            (True, False), repeat=len(symbols) - len(model)
+        ):
+            completed = assigned + rest
+            if knowledge(completed) and not query(completed):
+                return False
+        return True
+
+    # Choose the next unused symbol, extend the model both ways,
+    # and ensure entailment holds in both
+    p = symbols[len(model)]
+    for value in (True, False):
+        model[p] = value
+        holds = check_all(knowledge, query, symbols, model)
+        del model[p]
+        if not holds:
+            return False
+    return True
+
+
+def branching_order(knowledge, query):
+    """
+    Orders the symbols of knowledge and query for branching, most
+    frequently occurring first, since they are the most likely to decide
+    sentences early.
+    """
+    counts = symbol_occurrences(query, symbol_occurrences(knowledge))
+    return sorted(counts, key=lambda symbol: (-counts[symbol], symbol))
 
 
 def model_check(knowledge, query):
     """Checks if knowledge base entails query."""
+    symbols = branching_order(knowledge, query)
 
-    def check_all(knowledge, query, symbols, model):
-        """Checks if knowledge base entails query, given a particular model."""
+    # Check that knowledge entails query
+    return check_all(knowledge, query, symbols, dict())
 
-        # If model has an assignment for each symbol
-        if not symbols:
 
-            # If knowledge base is true in model, then query must also be true
-            if knowledge.evaluate(model):
-                return query.evaluate(model)
-            return True
+# Sentences checked by each parallel model checking worker
+worker_problem = None
+
+
+def start_worker(knowledge, query, symbols):
+    """Stores the problem in a worker process, once per process."""
+    global worker_problem
+    worker_problem = (knowledge, query, symbols)
+
+
+def check_cube(cube):
+    """Checks entailment in a worker, with the first symbols fixed to cube."""
+    knowledge, query, symbols = worker_problem
+    return check_all(knowledge, query, symbols, dict(zip(symbols, cube)))
+
+
+def model_check_parallel(knowledge, query, split=None, processes=None):
+    """
+    Checks if knowledge base entails query using a pool of processes.
+
+    The first `split` symbols are fixed in all 2^split ways, and each of
+    those cubes is checked by a worker. As soon as one cube contains a
+    counter-model the pool is terminated. By default there are several
+    cubes per process so that uneven cubes still balance across them.
+    """
+    symbols = branching_order(knowledge, query)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if split is None:
+        split = (processes - 1).bit_length() + 3
+    split = min(split, len(symbols))
+
+    cubes = itertools.product((True, False), repeat=split)
+    with multiprocessing.Pool(
+        processes, start_worker, (knowledge, query, symbols)
+    ) as pool:
+        for holds in pool.imap_unordered(check_cube, cubes):
+            if not holds:
+                return False
+    return True
+
+
+ENTAILED = "entailed"
+REFUTED = "refuted"
+UNDETERMINED = "undetermined"
+
+
+def model_check_many(knowledge, queries):
+    """
+    Checks many queries against one knowledge base in a single pass over
+    its models. Returns a dictionary mapping each query to ENTAILED if it
+    holds in every model of the knowledge base, REFUTED if it holds in
+    none, and UNDETERMINED otherwise.
+    """
+    queries = list(dict.fromkeys(queries))
+
+    # Get all symbols in knowledge and every query
+    symbols = sorted(knowledge.symbols().union(
+        *[query.symbols() for query in queries]
+    ))
+
+    # Compile every sentence over the same symbol order
+    knowledge = knowledge.compile(symbols)
+    compiled = {query: query.compile(symbols) for query in queries}
+
+    # Track whether each query has been seen true and false
+    seen = {query: set() for query in queries}
+    open_queries = list(queries)
+
+    for model in itertools.product((True, False), repeat=len(symbols)):
+        if not open_queries:
+            break
+        if not knowledge(model):
+            continue
+        for query in open_queries:
+            seen[query].add(compiled[query](model))
+
+        # Queries seen both true and false can no longer be decided
+        open_queries = [query for query in open_queries
+                        if len(seen[query]) < 2]
+
+    results = dict()
+    for query in queries:
+        if len(seen[query]) == 2:
+            results[query] = UNDETERMINED
+        elif False in seen[query]:
+            results[query] = REFUTED
         else:
+            results[query] = ENTAILED
+    return results
 
-            # Choose one of the remaining unused symbols
-            remaining = symbols.copy()
-            p = remaining.pop()
 
-            # Create a model where the symbol is true
-            model_true = model.copy()
-            model_true[p] = True
+def model_check_vectorized(knowledge, query, chunk_bits=20):
+    """
+    Checks if knowledge base entails query by evaluating every model at once.
 
-            # Create a model where the symbol is false
-            model_false = model.copy()
-            model_false[p] = False
-
-            # Ensure entailment holds in both models
-            return (check_all(knowledge, query, remaining, model_true) and
-                    check_all(knowledge, query, remaining, model_false))
+    Each symbol becomes a bit-packed NumPy array holding its value in all
+    2^n models, so sentences evaluate as bitwise operations on 64 models
+    per word. Models are processed in chunks of 2^`chunk_bits` so memory
+    stays bounded as the number of symbols grows.
+    """
+    import numpy
 
     # Get all symbols in both knowledge and query
-    symbols = set.union(knowledge.symbols(), query.symbols())
+    symbols = sorted(knowledge.symbols() | query.symbols())
+    n = len(symbols)
+
+    # Symbols below 6 vary within each 64-bit word, the next ones between
+    # words of a chunk, and the rest are fixed for a whole chunk
+    ones = numpy.uint64(2 ** 64 - 1)
+    chunk_bits = max(chunk_bits, 6)
+    word_bits = min(n, chunk_bits) - 6 if n > 6 else 0
+    words = numpy.arange(2 ** word_bits, dtype=numpy.uint64)
+
+    columns = {None: numpy.zeros(len(words), dtype=numpy.uint64)}
+    for i, symbol in enumerate(symbols[:6]):
+        pattern = sum(1 << k for k in range(64) if (k >> i) & 1)
+        columns[symbol] = numpy.full(len(words), pattern, dtype=numpy.uint64)
+    for i, symbol in enumerate(symbols[6:6 + word_bits]):
+        columns[symbol] = numpy.where((words >> numpy.uint64(i)) & 1, ones, 0)
+
+    # Only the first 2^n bits are real models when there are fewer than 6
+    mask = numpy.uint64(2 ** (2 ** n) - 1) if n < 6 else ones
+
+    fixed = symbols[6 + word_bits:]
+    for chunk in range(2 ** len(fixed)):
+        for i, symbol in enumerate(fixed):
+            columns[symbol] = ones * ((chunk >> i) & 1) + columns[None]
+
+        # A model where knowledge base is true but query is false refutes
+        counter = (knowledge.vectorize(columns)
+                   & ~query.vectorize(columns) & mask)
+        if counter.any():
+            return False
+    return True
+
+
+class KnowledgeBase():
+    """
+    Incremental knowledge base that keeps its sentences compiled into
+    BDD nodes between queries, so its size follows the structure of the
+    sentences rather than their number of models. Sentences that share
+    no symbols, even through other sentences, are kept in separate
+    groups with a node each, so adding a sentence only conjoins it with
+    the groups of its own symbols. push/pop save and restore the
+    knowledge base so that temporary sentences can be retracted cheaply.
+    """
+
+    def __init__(self, *sentences):
+        self.sentences = []
+        self.bdd = BDD()
+
+        # Group of each symbol, and the node and symbols of each group.
+        # Sentences with no symbols go in group None, which is made
+        # false if any group is, so that it decides consistency
+        self.groups = dict()
+        self.nodes = {None: (BDD.TRUE, frozenset())}
+
+        # Results of previous queries, keyed by query and assumptions
+        self.results = dict()
+
+        # Saved states for pop, and the changes to self.groups and
+        # self.nodes since the first of them, as (dictionary, key,
+        # previous value) with None for keys that were missing
+        self.frames = []
+        self.trail = []
+
+        for sentence in sentences:
+            self.add(sentence)
+
+    def add(self, sentence):
+        """Adds a sentence to the knowledge base."""
+        Sentence.validate(sentence)
+        names = sentence.symbols()
+        groups = {self.groups[name] for name in names if name in self.groups}
+
+        # Merge the sentence into the largest group it touches, or into
+        # a new group named after its position
+        if not names:
+            groups = {None}
+        key = max(groups, key=lambda group: len(self.nodes[group][1]),
+                  default=len(self.sentences))
+        node, members = self.nodes.get(key, (BDD.TRUE, frozenset()))
+        node = self.bdd.apply("and", node, self.bdd.build(sentence))
+        moved = set(names)
+        for group in groups - {key}:
+            group_node, group_members = self.nodes[group]
+            node = self.bdd.apply("and", node, group_node)
+            moved.update(group_members)
+            self.assign(self.nodes, group, None)
+        for name in moved:
+            if self.groups.get(name) != key:
+                self.assign(self.groups, name, key)
+        self.assign(self.nodes, key, (node, members | moved))
+        if node == BDD.FALSE:
+            self.assign(self.nodes, None, (BDD.FALSE, frozenset()))
+
+        self.sentences.append(sentence)
+        self.results = dict()
+
+    def assign(self, dictionary, key, value):
+        """
+        Sets a key of self.groups or self.nodes, or deletes it if value
+        is None, recording the previous value if a pop may undo it.
+        """
+        if self.frames:
+            self.trail.append((dictionary, key, dictionary.get(key)))
+        if value is None:
+            del dictionary[key]
+        else:
+            dictionary[key] = value
+
+    def push(self):
+        """Saves the current state so a later pop can restore it."""
+        self.frames.append((len(self.sentences), len(self.trail),
+                            self.results))
+
+    def pop(self):
+        """Retracts every sentence added since the matching push."""
+        if not self.frames:
+            raise Exception("pop without matching push")
+        sentences, trail, self.results = self.frames.pop()
+        while len(self.trail) > trail:
+            dictionary, key, value = self.trail.pop()
+            if value is None:
+                del dictionary[key]
+            else:
+                dictionary[key] = value
+        del self.sentences[sentences:]
+
+    def sentence(self):
+        """Returns the conjunction of all sentences in the knowledge base."""
+        return And(*self.sentences)
+
+    def satisfiable(self, assumptions=()):
+        """Checks if the knowledge base is consistent with assumptions."""
+        return bool(self.check_many([], assumptions)[1])
+
+    def entails(self, query, assumptions=()):
+        """Checks if the knowledge base and assumptions entail query."""
+        return self.check_many([query], assumptions)[0][query] == ENTAILED
+
+    def check_many(self, queries, assumptions=()):
+        """
+        Classifies each query as ENTAILED, REFUTED or UNDETERMINED under
+        the knowledge base and assumptions, like model_check_many. Returns
+        the classifications and whether any model satisfies assumptions.
+        """
+        queries = list(dict.fromkeys(queries))
+        assumptions = tuple(dict.fromkeys(assumptions))
+        for sentence in (*queries, *assumptions):
+            Sentence.validate(sentence)
+
+        key = (None, assumptions)
+        missing = [query for query in queries
+                   if (query, assumptions) not in self.results]
+        if missing or key not in self.results:
+            self.results.update(self.classify(missing, assumptions))
+
+        results = {query: self.results[(query, assumptions)]
+                   for query in queries}
+        return results, self.results[key]
+
+    def classify(self, queries, assumptions):
+        """
+        Classifies queries under the knowledge base and assumptions,
+        returning results keyed like self.results, with (None, assumptions)
+        recording whether the assumptions are consistent with it.
+        """
+        results = dict()
+        bdd = self.bdd
+        node, _ = self.nodes[None]
+        included = {None}
+        for assumption in assumptions:
+            node = self.conjoin(node, assumption, included)
+            node = bdd.apply("and", node, bdd.build(assumption))
+
+        # A query is entailed if no model satisfies its negation, and
+        # refuted if no model satisfies it. Groups sharing no symbols
+        # with the query or assumptions are consistent and independent
+        # of them, so they cannot change the answer
+        for query in queries:
+            node_query = self.conjoin(node, query, set(included))
+            u = bdd.build(query)
+            if bdd.apply("and", node_query, bdd.negate(u)) == BDD.FALSE:
+                results[(query, assumptions)] = ENTAILED
+            elif bdd.apply("and", node_query, u) == BDD.FALSE:
+                results[(query, assumptions)] = REFUTED
+            else:
+                results[(query, assumptions)] = UNDETERMINED
+        results[(None, assumptions)] = node != BDD.FALSE
+
+        return results
+
+    def conjoin(self, node, sentence, included):
+        """
+        Conjoins a node with the groups of a sentence's symbols that are
+        not yet in the set `included`, adding them to it.
+        """
+        for name in sentence.symbols():
+            group = self.groups.get(name)
+            if group is not None and group not in included:
+                included.add(group)
+                node = self.bdd.apply("and", node, self.nodes[group][0])
+        return node
+
+
+class CNF():
+    """
+    Clause form of logical sentences built by Tseitin's transformation.
+
+    Every compound subsentence gets its own variable defined by a few
+    clauses, so the clause list grows linearly with sentence size and is
+    satisfiable exactly when the sentences are. Clauses are lists of
+    nonzero integers as in DIMACS: variable v is the literal v and its
+    negation is -v.
+    """
+
+    def __init__(self, *sentences):
+        self.clauses = []
+
+        # DIMACS variable for each symbol name
+        self.variables = dict()
+
+        # Number of variables used, including auxiliary ones
+        self.count = 0
+
+        # Literal defined for each subsentence
+        self.literals = dict()
+
+        for sentence in sentences:
+            self.add(sentence)
+
+    def variable(self):
+        """Returns a fresh variable."""
+        self.count += 1
+        return self.count
+
+    def add(self, sentence):
+        """Adds clauses asserting that sentence is true."""
+        Sentence.validate(sentence)
+        if isinstance(sentence, And):
+            for conjunct in sentence.conjuncts:
+                self.add(conjunct)
+        elif isinstance(sentence, Or):
+            self.clauses.append(
+                [self.literal(disjunct) for disjunct in sentence.disjuncts]
+            )
+        else:
+            self.clauses.append([self.literal(sentence)])
+
+    def literal(self, sentence):
+        """Returns a literal equivalent to sentence, defining it if needed."""
+        if sentence in self.literals:
+            return self.literals[sentence]
+
+        if isinstance(sentence, Symbol):
+            if sentence.name not in self.variables:
+                self.variables[sentence.name] = self.variable()
+            literal = self.variables[sentence.name]
+
+        elif isinstance(sentence, Not):
+            literal = -self.literal(sentence.operand)
+
+        elif isinstance(sentence, And):
+            operands = [self.literal(c) for c in sentence.conjuncts]
+            literal = self.variable()
+            for operand in operands:
+                self.clauses.append([-literal, operand])
+            self.clauses.append([literal] + [-operand for operand in operands])
+
+        elif isinstance(sentence, Or):
+            operands = [self.literal(d) for d in sentence.disjuncts]
+            literal = self.variable()
+            for operand in operands:
+                self.clauses.append([literal, -operand])
+            self.clauses.append([-literal] + operands)
+
+        elif isinstance(sentence, Implication):
+            a = self.literal(sentence.antecedent)
+            b = self.literal(sentence.consequent)
+            literal = self.variable()
+            self.clauses.extend([[-literal, -a, b], [literal, a], [literal, -b]])
+
+        elif isinstance(sentence, Biconditional):
+            a = self.literal(sentence.left)
+            b = self.literal(sentence.right)
+            literal = self.variable()
+            self.clauses.extend([
+                [-literal, -a, b], [-literal, a, -b],
+                [literal, a, b], [literal, -a, -b]
+            ])
 
-    # Check that knowledge entails query
-    return check_all(knowledge, query, symbols, dict())
+        else:
+            raise TypeError(f"cannot convert {type(sentence).__name__}")
+
+        self.literals[sentence] = literal
+        return literal
+
+    def to_dimacs(self):
+        """Returns the clauses in DIMACS CNF format."""
+        lines = [f"c symbol {variable} {name}"
+                 for name, variable in self.variables.items()]
+        lines.append(f"p cnf {self.count} {len(self.clauses)}")
+        for clause in self.clauses:
+            lines.append(" ".join(str(literal) for literal in clause) + " 0")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def from_dimacs(cls, text):
+        """
+        Parses DIMACS CNF text. Symbol names are read back from the
+        `c symbol` comments written by to_dimacs, if present.
+        """
+        cnf = cls()
+        clause = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith("%"):
+                continue
+            if line.startswith("c"):
+                words = line.split(maxsplit=3)
+                if len(words) == 4 and words[1] == "symbol":
+                    cnf.variables[words[3]] = int(words[2])
+                continue
+            if line.startswith("p"):
+                words = line.split()
+                if len(words) != 4 or words[1] != "cnf":
+                    raise ValueError(f"invalid problem line: {line}")
+                cnf.count = int(words[2])
+                continue
+            for word in line.split():
+                literal = int(word)
+                if literal == 0:
+                    cnf.clauses.append(clause)
+                    clause = []
+                else:
+                    clause.append(literal)
+                    cnf.count = max(cnf.count, abs(literal))
+        if clause:
+            cnf.clauses.append(clause)
+        return cnf
+
+
+class BDD():
+    """
+    Reduced ordered binary decision diagrams over logical symbols.
+
+    Nodes are integers: 0 is false, 1 is true, and every other node is
+    a (level, low, high) triple testing the symbol at that level of
+    self.order. A unique table keeps one node per triple, so equivalent
+    sentences compile to the same node, and an operation cache makes
+    each apply linear in the product of its operands' sizes.
+    """
+
+    FALSE = 0
+    TRUE = 1
+
+    OPERATIONS = {
+        "and": lambda a, b: a and b,
+        "or": lambda a, b: a or b,
+        "xor": lambda a, b: a != b,
+        "implies": lambda a, b: (not a) or b,
+        "iff": lambda a, b: a == b,
+    }
+
+    def __init__(self, order=()):
+        # Symbol names, from the top of the diagram to the bottom
+        self.order = []
+        self.levels = dict()
+
+        # Terminals sit below every symbol, at level infinity
+        self.nodes = [(float("inf"), None, None), (float("inf"), None, None)]
+        self.unique = dict()
+        self.cache = dict()
+
+        # Node built for each sentence
+        self.built = dict()
+
+        for name in order:
+            self.level(name)
+
+    def level(self, name):
+        """Returns the level of a symbol, adding it below all others if new."""
+        if name not in self.levels:
+            self.levels[name] = len(self.order)
+            self.order.append(name)
+        return self.levels[name]
+
+    def node(self, level, low, high):
+        """Returns the unique node testing `level` with the given children."""
+        if low == high:
+            return low
+        key = (level, low, high)
+        if key not in self.unique:
+            self.unique[key] = len(self.nodes)
+            self.nodes.append(key)
+        return self.unique[key]
+
+    def variable(self, name):
+        """Returns the node that is true exactly when symbol `name` is."""
+        return self.node(self.level(name), BDD.FALSE, BDD.TRUE)
+
+    def apply(self, operation, u, v):
+        """
+        Combines two nodes with a binary operation from OPERATIONS.
+
+        Pairs of nodes are expanded with an explicit stack rather than
+        recursively, so diagrams may have any number of levels. A pair
+        whose children are not both known is pushed again with its level
+        before its children, and is built from the top two results when
+        popped the second time. An entry without a second node is a
+        result already known, kept in order on the stack.
+        """
+        known = BDD.known
+        function = BDD.OPERATIONS[operation]
+        cache = self.cache
+        result = known(function, cache, operation, u, v)
+        if result is not None:
+            return result
+
+        results = []
+        stack = [(u, v, None)]
+        while stack:
+            u, v, level = stack.pop()
+            if level is not None:
+                high = results.pop()
+                low = results.pop()
+                node = self.node(level, low, high)
+                cache[(operation, u, v)] = node
+                results.append(node)
+                continue
+            if v is None:
+                results.append(u)
+                continue
+
+            u_level, u_low, u_high = self.nodes[u]
+            v_level, v_low, v_high = self.nodes[v]
+            level = min(u_level, v_level)
+            if u_level != level:
+                u_low = u_high = u
+            if v_level != level:
+                v_low = v_high = v
+            low = known(function, cache, operation, u_low, v_low)
+            high = known(function, cache, operation, u_high, v_high)
+            if low is not None and high is not None:
+                node = self.node(level, low, high)
+                cache[(operation, u, v)] = node
+                results.append(node)
+                continue
+
+            # The low result must end up below the high one
+            stack.append((u, v, level))
+            if high is None:
+                stack.append((u_high, v_high, None))
+            else:
+                stack.append((high, None, None))
+            if low is None:
+                stack.append((u_low, v_low, None))
+            else:
+                results.append(low)
+        return results.pop()
+
+    @staticmethod
+    def known(function, cache, operation, u, v):
+        """
+        Returns the result of an operation on two nodes if it is cached
+        or follows from a terminal operand alone, and None otherwise.
+        """
+        if u <= BDD.TRUE:
+            if v <= BDD.TRUE:
+                return int(function(bool(u), bool(v)))
+            low, high = function(bool(u), False), function(bool(u), True)
+            if low == high:
+                return int(low)
+            if high:
+                return v
+        elif v <= BDD.TRUE:
+            low, high = function(False, bool(v)), function(True, bool(v))
+            if low == high:
+                return int(low)
+            if high:
+                return u
+        return cache.get((operation, u, v))
+
+    def negate(self, u):
+        """Returns the negation of a node."""
+        return self.apply("xor", u, BDD.TRUE)
+
+    def build(self, sentence):
+        """Compiles a sentence into a node."""
+        if sentence in self.built:
+            return self.built[sentence]
+
+        if isinstance(sentence, Symbol):
+            u = self.variable(sentence.name)
+        elif isinstance(sentence, Not):
+            u = self.negate(self.build(sentence.operand))
+        elif isinstance(sentence, And):
+            u = BDD.TRUE
+            for conjunct in sentence.conjuncts:
+                u = self.apply("and", u, self.build(conjunct))
+        elif isinstance(sentence, Or):
+            u = BDD.FALSE
+            for disjunct in sentence.disjuncts:
+                u = self.apply("or", u, self.build(disjunct))
+        elif isinstance(sentence, Implication):
+            u = self.apply("implies", self.build(sentence.antecedent),
+                           self.build(sentence.consequent))
+        elif isinstance(sentence, Biconditional):
+            u = self.apply("iff", self.build(sentence.left),
+                           self.build(sentence.right))
+        else:
+            raise TypeError(f"cannot compile {type(sentence).__name__}")
+
+        self.built[sentence] = u
+        return u
+
+    def entails(self, u, v):
+        """Checks if node u entails node v."""
+        return self.apply("implies", u, v) == BDD.TRUE
+
+    def size(self, u):
+        """Returns the number of nodes reachable from u, terminals included."""
+        seen = set()
+        frontier = [u]
+        while frontier:
+            node = frontier.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            if node > BDD.TRUE:
+                frontier.extend(self.nodes[node][1:])
+        return len(seen)
+
+    def count(self, u):
+        """Counts the models of node u over every symbol in self.order."""
+        n = len(self.order)
+
+        def depth(node):
+            return min(self.nodes[node][0], n)
+
+        # Models of each node over the symbols from its level down,
+        # counted once both of its children have been
+        counts = {BDD.FALSE: 0, BDD.TRUE: 1}
+        stack = [u]
+        while stack:
+            node = stack[-1]
+            if node in counts:
+                stack.pop()
+                continue
+            level, low, high = self.nodes[node]
+            missing = [child for child in (low, high) if child not in counts]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            counts[node] = (
+                counts[low] * 2 ** (depth(low) - level - 1)
+                + counts[high] * 2 ** (depth(high) - level - 1)
+            )
+
+        return counts[u] * 2 ** depth(u)
+
+    def models(self, u):
+        """
+        Yields every model of node u as a dictionary over all symbols in
+        self.order.
+        """
+        n = len(self.order)
+
+        # Each entry is a node to expand from a level, after setting the
+        # symbol above that level to a value. The entries popped between
+        # an entry and its sibling only set symbols further down, so
+        # `values` always holds the path to the entry being expanded
+        values = [False] * n
+        stack = [(u, 0, None)]
+        while stack:
+            node, level, value = stack.pop()
+            if level:
+                values[level - 1] = value
+            if node == BDD.FALSE:
+                continue
+            if level == n:
+                yield dict(zip(self.order, values))
+                continue
+            node_level, low, high = self.nodes[node]
+            if node_level != level:
+                low = high = node
+            stack.append((high, level + 1, True))
+            stack.append((low, level + 1, False))
+
+
+def model_check_bdd(knowledge, query, bdd=None):
+    """
+    Checks if knowledge base entails query by compiling both into a BDD.
+    Passing the same `bdd` for repeated queries reuses the compiled
+    knowledge base.
+    """
+    if bdd is None:
+        bdd = BDD()
+    return bdd.entails(bdd.build(knowledge), bdd.build(query))
+
+
+class ResolutionProver():
+    """
+    Proves entailment by resolution refutation over Tseitin clauses.
+
+    The clauses of the negated query form the set of support: only they,
+    and clauses derived from them, are resolved, shortest first, against
+    the rest. Clauses are indexed by literal so that resolution partners
+    and subsumption candidates are found without scanning every clause,
+    and tautologies and subsumed clauses are discarded as they appear.
+
+    Set-of-support resolution never resolves the knowledge base against
+    itself, so it cannot tell that an unsatisfiable knowledge base
+    entails everything. Before answering False, the knowledge base is
+    checked for consistency once with a BDD.
+    """
+
+    def __init__(self, knowledge, max_clauses=100000):
+        Sentence.validate(knowledge)
+        self.knowledge = knowledge
+        self.max_clauses = max_clauses
+
+        # Whether the knowledge base is satisfiable, once checked
+        self.consistent = None
+
+        # Counters from the most recent call to entails
+        self.statistics = dict()
+
+    def entails(self, query):
+        """
+        Checks if knowledge base entails query. Returns None if more than
+        max_clauses clauses were kept or waiting in the set of support
+        without deciding.
+        """
+        Sentence.validate(query)
+        self.statistics = {
+            "given": 0,
+            "resolvents": 0,
+            "tautologies": 0,
+            "forward_subsumed": 0,
+            "backward_subsumed": 0,
+            "kept": 0,
+        }
+
+        cnf = CNF(self.knowledge)
+        n = len(cnf.clauses)
+        cnf.add(Not(query))
+
+        # Clauses kept so far, and the clauses containing each literal
+        self.clauses = dict()
+        self.index = dict()
+        self.next_id = 0
+
+        for clause in cnf.clauses[:n]:
+            clause = self.simplify(clause)
+            if clause is not None:
+                self.keep(clause)
+
+        # Set of support, ordered by clause length then age
+        support = []
+        for clause in cnf.clauses[n:]:
+            self.push_support(support, clause)
+
+        while support:
+            _, _, clause = heapq.heappop(support)
+            if not clause:
+                return True
+            if self.subsumed(clause):
+                self.statistics["forward_subsumed"] += 1
+                continue
+            self.statistics["given"] += 1
+
+            # Resolve on every literal against clauses with its negation
+            for literal in clause:
+                for other in list(self.index.get(-literal, ())):
+                    resolvent = ((clause - {literal})
+                                 | (self.clauses[other] - {-literal}))
+                    self.statistics["resolvents"] += 1
+                    self.push_support(support, resolvent)
+                    if len(self.clauses) + len(support) > self.max_clauses:
+                        return None
+
+            self.keep(clause)
+            if len(self.clauses) + len(support) > self.max_clauses:
+                return None
+
+        # Without a refutation, the query is only not entailed if the
+        # knowledge base has a model
+        if self.consistent is None:
+            self.consistent = BDD().build(self.knowledge) != BDD.FALSE
+        return not self.consistent
+
+    def simplify(self, clause):
+        """Returns clause as a frozenset, or None if it is a tautology."""
+        clause = frozenset(clause)
+        if any(-literal in clause for literal in clause):
+            self.statistics["tautologies"] += 1
+            return None
+        return clause
+
+    def push_support(self, support, clause):
+        """Adds a clause to the set of support unless it is a tautology."""
+        clause = self.simplify(clause)
+        if clause is not None:
+            heapq.heappush(support, (len(clause), self.next_id, clause))
+            self.next_id += 1
+
+    def subsumed(self, clause):
+        """Checks if some kept clause is a subset of clause."""
+        for literal in clause:
+            for other in self.index.get(literal, ()):
+                if self.clauses[other] <= clause:
+                    return True
+        return False
+
+    def keep(self, clause):
+        """
+        Keeps a clause for resolution, first removing every kept clause
+        it subsumes.
+        """
+        if self.subsumed(clause):
+            self.statistics["forward_subsumed"] += 1
+            return
+
+        # Clauses containing every literal of clause are subsumed by it
+        if clause:
+            literals = sorted(clause, key=lambda l: len(self.index.get(l, ())))
+            candidates = set(self.index.get(literals[0], ()))
+            for literal in literals[1:]:
+                candidates &= self.index.get(literal, set())
+            for other in candidates:
+                self.statistics["backward_subsumed"] += 1
+                for literal in self.clauses.pop(other):
+                    self.index[literal].discard(other)
+
+        self.clauses[self.next_id] = clause
+        for literal in clause:
+            self.index.setdefault(literal, set()).add(self.next_id)
+        self.next_id += 1
+        self.statistics["kept"] += 1
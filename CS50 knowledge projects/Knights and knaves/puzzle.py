@@ -81,13 +81,19 @@ def main():
         ("Puzzle 2", knowledge2),
         ("Puzzle 3", knowledge3)
     ]
+    # Every puzzle shares the same base knowledge
+    base = KnowledgeBase(knowledgeBase)
     for puzzle, knowledge in puzzles:
         print(puzzle)
         if len(knowledge.conjuncts) == 0:
             print("    Not yet implemented.")
         else:
+            base.push()
+            base.add(knowledge)
+            results, _ = base.check_many(symbols)
+            base.pop()
             for symbol in symbols:
-                if model_check(knowledge, symbol):
+                if results[symbol] == ENTAILED:
                     print(f"    {symbol}")
 
 
@@ -0,0 +1,156 @@
+import argparse
+import multiprocessing
+import random
+import time
+
+from minesweeper import Minesweeper, MinesweeperAI
+
+# Height, width and number of mines of the standard difficulties
+SIZES = {
+    "beginner": (8, 8, 10),
+    "intermediate": (16, 16, 40),
+    "expert": (16, 30, 99),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play Minesweeper games with MinesweeperAI, headless."
+    )
+    parser.add_argument(
+        "sizes", nargs="*", default=list(SIZES),
+        help="beginner, intermediate, expert, or HEIGHTxWIDTHxMINES"
+    )
+    parser.add_argument("-n", "--games", type=int, default=1000)
+    parser.add_argument("-p", "--processes", type=int, default=None)
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument(
+        "--random", action="store_true",
+        help="guess with make_random_move instead of make_probable_move"
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        height, width, mines = parse_size(size)
+        results = benchmark(height, width, mines, args.games,
+                            processes=args.processes, seed=args.seed,
+                            probable=not args.random)
+        print(f"{size} ({height}x{width}, {mines} mines), {args.games} games")
+        report(results)
+
+
+def parse_size(size):
+    """Returns height, width and mines for a difficulty or HxWxM string."""
+    if size in SIZES:
+        return SIZES[size]
+    try:
+        height, width, mines = (int(n) for n in size.lower().split("x"))
+    except ValueError:
+        raise SystemExit(f"Invalid size: {size}")
+    return height, width, mines
+
+
+def benchmark(height, width, mines, games, processes=None, seed=0,
+              probable=True):
+    """
+    Plays `games` games across a pool of processes and returns the
+    result of each game, as returned by play.
+    """
+    jobs = [(height, width, mines, seed + game, probable)
+            for game in range(games)]
+    with multiprocessing.Pool(processes) as pool:
+        return pool.starmap(play, jobs, chunksize=max(1, games // 64))
+
+
+def play(height, width, mines, seed, probable=True):
+    """
+    Plays one game until the AI hits a mine or runs out of moves.
+
+    Returns a dictionary with whether the game was won, the number of
+    moves, total time spent choosing moves and adding knowledge, and
+    the size of the AI's knowledge base after each move.
+    """
+    random.seed(seed)
+    game = Minesweeper(height=height, width=width, mines=mines)
+    ai = MinesweeperAI(height=height, width=width, mines=mines)
+
+    moves = 0
+    move_time = 0
+    inference_time = 0
+    knowledge_sizes = []
+    won = False
+
+    while True:
+        start = time.perf_counter()
+        move = ai.make_safe_move()
+        if move is None:
+            if probable:
+                move = ai.make_probable_move()
+            else:
+                move = ai.make_random_move()
+        move_time += time.perf_counter() - start
+
+        if move is None:
+            won = True
+            break
+        if game.is_mine(move):
+            break
+
+        moves += 1
+        start = time.perf_counter()
+        ai.add_knowledge(move, game.nearby_mines(move))
+        inference_time += time.perf_counter() - start
+        knowledge_sizes.append(len(ai.knowledge))
+
+        # Every safe cell revealed
+        if len(ai.moves_made) == height * width - mines:
+            won = True
+            break
+
+    return {
+        "won": won,
+        "moves": moves,
+        "move_time": move_time,
+        "inference_time": inference_time,
+        "knowledge_sizes": knowledge_sizes,
+    }
+
+
+def report(results):
+    """Prints summary statistics for a list of game results."""
+    games = len(results)
+    wins = sum(result["won"] for result in results)
+    moves = sum(result["moves"] for result in results)
+    move_time = sum(result["move_time"] for result in results)
+    inference_time = sum(result["inference_time"] for result in results)
+    total_time = move_time + inference_time
+
+    print(f"  Win rate: {wins / games:.1%} ({wins}/{games})")
+    print(f"  Moves per game: {moves / games:.1f}")
+    if total_time:
+        print(f"  Moves per second: {moves / total_time:.0f}")
+    if moves:
+        print(f"  Inference time per move: {inference_time / moves * 1e6:.0f} µs")
+        print(f"  Move selection time per move: {move_time / moves * 1e6:.0f} µs")
+
+    # Knowledge base size by move number, averaged over games still going
+    sizes = dict()
+    for result in results:
+        for move, size in enumerate(result["knowledge_sizes"]):
+            sizes.setdefault(move, []).append(size)
+    if sizes:
+        peak = max(max(result["knowledge_sizes"], default=0)
+                   for result in results)
+        print(f"  Knowledge base peak size: {peak} sentences")
+        longest = max(sizes)
+        checkpoints = sorted({0, longest // 4, longest // 2,
+                              3 * longest // 4, longest})
+        growth = ", ".join(
+            f"move {move + 1}: {sum(sizes[move]) / len(sizes[move]):.1f}"
+            for move in checkpoints
+        )
+        print(f"  Knowledge base mean size: {growth}")
+
+
+if __name__ == "__main__":
+    main()
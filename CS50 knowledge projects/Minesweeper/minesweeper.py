@@ -1,6 +1,11 @@
 import itertools
+import math
 import random
 
+from collections import deque
+
+import numpy
+
 
 class Minesweeper():
     """
@@ -12,27 +17,43 @@ class Minesweeper():
         # Set initial width, height, and number of mines
         self.height = height
         self.width = width
-        self.mines = set()
-
-        # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
 
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        # Add mines randomly, drawing distinct cells all at once. The
+        # generator is seeded from `random` so random.seed still
+        # reproduces a game.
+        generator = numpy.random.default_rng(random.getrandbits(64))
+        positions = generator.choice(height * width, mines, replace=False)
+        self.board = numpy.zeros((height, width), dtype=bool)
+        self.board.flat[positions] = True
+        self.mines = {divmod(int(position), width) for position in positions}
+
+        # Count every cell's neighboring mines once, by summing the
+        # board shifted in each of the eight directions
+        self.counts = self.neighborhood_sum(self.board) - self.board
+
+        # Labels of the regions of cells with no nearby mines, and the
+        # sorted labels with each region's bounding box, computed on the
+        # first reveal that needs them
+        self.regions = None
+        self.boxes = None
 
         # At first, player has found no mines
         self.mines_found = set()
 
+    @staticmethod
+    def neighborhood_sum(grid):
+        """
+        Returns, for each cell, the sum of `grid` over the 3x3 window
+        centred on it, treating cells off the board as zero.
+        """
+        height, width = grid.shape
+        padded = numpy.pad(grid.astype(numpy.uint8), 1)
+        total = numpy.zeros((height, width), dtype=numpy.uint8)
+        for di in range(3):
+            for dj in range(3):
+                total += padded[di:di + height, dj:dj + width]
+        return total
+
     def print(self):
         """
         Prints a text-based representation
@@ -41,7 +62,7 @@ class Minesweeper():
         for i in range(self.height):
             print("--" * self.width + "-")
             for j in range(self.width):
-                if self.board[i][j]:
+                if self.board[i, j]:
                     print("|X", end="")
                 else:
                     print("| ", end="")
@@ -50,7 +71,7 @@ class Minesweeper():
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return bool(self.board[i, j])
 
     def nearby_mines(self, cell):
         """
@@ -58,24 +79,109 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
+        i, j = cell
+        return int(self.counts[i, j])
 
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
+    def reveal(self, cell):
+        """
+        Returns a dictionary from each cell uncovered by clicking `cell`
+        to its number of nearby mines. Clicking a cell with no nearby
+        mines also uncovers its neighbors, repeatedly, so a whole region
+        of such cells and its border are revealed.
+        """
+        if self.is_mine(cell):
+            return dict()
+        if self.counts[cell] != 0:
+            return {cell: self.nearby_mines(cell)}
+        if self.regions is None:
+            self.regions = self.label_regions()
+            self.boxes = self.region_boxes(self.regions)
+
+        # Work only within the region's bounding box, grown by one cell
+        # on each side to take in the numbered cells bordering it
+        labels, top, bottom, left, right = self.boxes
+        label = self.regions[cell]
+        k = numpy.searchsorted(labels, label)
+        top, left = max(top[k] - 1, 0), max(left[k] - 1, 0)
+        bottom = min(bottom[k] + 2, self.height)
+        right = min(right[k] + 2, self.width)
+        box = numpy.s_[top:bottom, left:right]
+
+        # The whole region of cells without nearby mines, plus the
+        # numbered cells bordering it
+        region = self.regions[box] == label
+        region = (self.neighborhood_sum(region) > 0) & ~self.board[box]
+
+        cells = numpy.argwhere(region) + (top, left)
+        return dict(zip(map(tuple, cells.tolist()),
+                        self.counts[box][region].tolist()))
+
+    def label_regions(self):
+        """
+        Labels each connected region of safe cells with no nearby mines
+        by the lowest flat index in it; every other cell gets -1.
 
-        return count
+        Regions are found with a vectorised union-find: every pair of
+        adjacent empty cells hooks the larger of their roots onto the
+        smaller, then pointer jumping flattens the trees, until every
+        pair shares a root.
+        """
+        empty = (self.counts == 0) & ~self.board
+        flat = numpy.arange(self.height * self.width).reshape(empty.shape)
+
+        # Adjacent pairs of empty cells, looking right, down and diagonally
+        pairs = []
+        for a, b in (
+            (numpy.s_[:, :-1], numpy.s_[:, 1:]),
+            (numpy.s_[:-1, :], numpy.s_[1:, :]),
+            (numpy.s_[:-1, :-1], numpy.s_[1:, 1:]),
+            (numpy.s_[:-1, 1:], numpy.s_[1:, :-1]),
+        ):
+            both = empty[a] & empty[b]
+            pairs.append((flat[a][both], flat[b][both]))
+        first = numpy.concatenate([pair[0] for pair in pairs])
+        second = numpy.concatenate([pair[1] for pair in pairs])
+
+        parent = flat.ravel().copy()
+        while True:
+            roots = parent[first], parent[second]
+            if (roots[0] == roots[1]).all():
+                break
+            numpy.minimum.at(parent, numpy.maximum(*roots),
+                             numpy.minimum(*roots))
+            while True:
+                grandparent = parent[parent]
+                if (grandparent == parent).all():
+                    break
+                parent = grandparent
+
+        labels = parent.reshape(empty.shape)
+        labels[~empty] = -1
+        return labels
+
+    @staticmethod
+    def region_boxes(labels):
+        """
+        Returns the distinct region labels in `labels`, in sorted order,
+        with arrays of each region's top, bottom, left and right rows and
+        columns.
+        """
+        width = labels.shape[1]
+        flat = numpy.flatnonzero(labels.ravel() >= 0)
+        order = numpy.argsort(labels.ravel()[flat], kind="stable")
+        flat = flat[order]
+        sorted_labels = labels.ravel()[flat]
+        starts = numpy.flatnonzero(
+            numpy.diff(sorted_labels, prepend=-1) != 0
+        )
+        rows, columns = flat // width, flat % width
+        return (
+            sorted_labels[starts],
+            numpy.minimum.reduceat(rows, starts),
+            numpy.maximum.reduceat(rows, starts),
+            numpy.minimum.reduceat(columns, starts),
+            numpy.maximum.reduceat(columns, starts),
+        )
 
     def won(self):
         """
@@ -101,6 +207,13 @@ class Sentence():
     def __str__(self):
         return f"{self.cells} = {self.count}"
 
+    def key(self):
+        """
+        Returns a hashable value identifying the sentence's current
+        cells and count, shared by all equal sentences.
+        """
+        return (frozenset(self.cells), self.count)
+
     def known_mines(self):
         """
         Returns the set of all cells in self.cells known to be mines.
@@ -134,18 +247,41 @@ class Sentence():
         if cell in self.cells:
             self.cells.remove(cell)
 
+    def within(self, other):
+        """
+        Checks if the sentence's cells are a strict subset of another
+        sentence's cells.
+        """
+        return self.cells < other.cells
+
+    def subtract(self, other):
+        """
+        Removes the cells of a sentence whose cells are a subset of this
+        one's, along with its mines.
+        """
+        self.cells -= other.cells
+        self.count -= other.count
+
 
 class MinesweeperAI():
     """
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    # Search nodes allowed per frontier component when enumerating
+    # mine configurations, and configurations sampled past that limit
+    MAX_SEARCH_NODES = 20000
+    SAMPLES = 50
+
+    def __init__(self, height=8, width=8, mines=None):
 
         # Set initial height and width
         self.height = height
         self.width = width
 
+        # Total number of mines on the board, if known
+        self.total_mines = mines
+
         # Keep track of which cells have been clicked on
         self.moves_made = set()
 
@@ -153,26 +289,167 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Safe cells in the order they were found; cells already chosen
+        # are skipped when they reach the front
+        self.pending = deque()
+
+        # Cells neither chosen nor known to be mines, by flat index
+        # i * width + j, as the first `remaining` positions of a
+        # permutation of all indices. Only positions that were swapped
+        # are stored: position p holds self.slots.get(p, p), and index v
+        # is at position self.positions.get(v, v).
+        self.remaining = height * width
+        self.slots = dict()
+        self.positions = dict()
+
+        # Sentences about the game known to be true, keyed by id
+        self.knowledge = dict()
+        self.next_id = 0
+
+        # Ids of the sentences that mention each cell
+        self.index = dict()
+
+        # Id of the one sentence with each key, and the key each id was
+        # last stored under
+        self.canonical = dict()
+        self.keys = dict()
+
+        # Ids of sentences that changed and may now determine cells
+        self.queue = deque()
+
+        # Cells whose sentences changed since the last elimination
+        self.dirty = set()
 
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
         """
+        if cell in self.mines:
+            return
         self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        self.discard_unknown(cell)
+        for sentence_id in self.index.pop(cell, ()):
+            self.knowledge[sentence_id].mark_mine(cell)
+            self.dirty.update(self.knowledge[sentence_id].cells)
+            self.queue.append(sentence_id)
 
     def mark_safe(self, cell):
         """
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
         """
+        if cell in self.safes:
+            return
         self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+        self.pending.append(cell)
+        for sentence_id in self.index.pop(cell, ()):
+            self.knowledge[sentence_id].mark_safe(cell)
+            self.dirty.update(self.knowledge[sentence_id].cells)
+            self.queue.append(sentence_id)
+
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge base, indexed by its cells,
+        and returns its id. Empty sentences carry no information and
+        are not added, and a sentence equal to a known one returns the
+        existing id.
+        """
+        if not sentence.cells:
+            return None
+        key = sentence.key()
+
+        # Sentences waiting in the queue may have changed since they
+        # were keyed, so check the existing sentence still matches
+        existing = self.canonical.get(key)
+        if existing is not None and self.knowledge[existing].key() == key:
+            return existing
+        sentence_id = self.next_id
+        self.next_id += 1
+        self.knowledge[sentence_id] = sentence
+        self.canonical[key] = sentence_id
+        self.keys[sentence_id] = key
+        for cell in sentence.cells:
+            self.index.setdefault(cell, set()).add(sentence_id)
+        self.dirty.update(sentence.cells)
+        self.queue.append(sentence_id)
+        return sentence_id
+
+    def remove_sentence(self, sentence_id):
+        """Removes a sentence and its index entries from the knowledge base."""
+        sentence = self.knowledge.pop(sentence_id)
+        key = self.keys.pop(sentence_id)
+        if self.canonical.get(key) == sentence_id:
+            del self.canonical[key]
+        for cell in sentence.cells:
+            self.index[cell].discard(sentence_id)
+
+    def rekey(self, sentence_id):
+        """
+        Updates the canonical key of a sentence that has changed. Returns
+        False, removing the sentence, if an equal sentence already exists.
+        """
+        key = self.knowledge[sentence_id].key()
+        old_key = self.keys[sentence_id]
+        if key == old_key:
+            return True
+        if self.canonical.get(old_key) == sentence_id:
+            del self.canonical[old_key]
+        self.keys[sentence_id] = key
+        if key in self.canonical:
+            self.remove_sentence(sentence_id)
+            return False
+        self.canonical[key] = sentence_id
+        return True
+
+    def subtract(self, sentence_id, subset):
+        """
+        Replaces a sentence with its difference from a sentence whose
+        cells are a subset of its own, which together imply the original.
+        """
+        sentence = self.knowledge[sentence_id]
+        for cell in subset.cells:
+            self.index[cell].discard(sentence_id)
+        sentence.subtract(subset)
+        self.queue.append(sentence_id)
+
+    def infer(self):
+        """
+        Processes queued sentences until no sentence changes: sentences
+        that have become determined mark their cells, empty and duplicate
+        sentences are removed, and whenever one sentence's cells are a
+        subset of another's, the larger is replaced by their difference.
+        """
+        while self.queue:
+            sentence_id = self.queue.popleft()
+            sentence = self.knowledge.get(sentence_id)
+            if sentence is None:
+                continue
+
+            # Determined sentences resolve into known mines or safes
+            for cell in sentence.known_mines().copy():
+                self.mark_mine(cell)
+            for cell in sentence.known_safes().copy():
+                self.mark_safe(cell)
+            if not sentence.cells:
+                self.remove_sentence(sentence_id)
+                continue
+            if not self.rekey(sentence_id):
+                continue
+
+            # Only sentences sharing a cell can be subsets or supersets
+            overlapping = set()
+            for cell in sentence.cells:
+                overlapping.update(self.index[cell])
+            overlapping.discard(sentence_id)
+
+            for other_id in overlapping:
+                other = self.knowledge[other_id]
+                if sentence.within(other):
+                    self.subtract(other_id, sentence)
+                elif other.within(sentence):
+                    self.subtract(sentence_id, other)
+                    break
 
     def add_knowledge(self, cell, count):
         """
@@ -189,6 +466,8 @@ class MinesweeperAI():
             5) add any new sentences to the AI's knowledge base
                if they can be inferred from existing knowledge
         """
+        if cell not in self.moves_made:
+            self.discard_unknown(cell)
         self.moves_made.add(cell)
 
         self.mark_safe(cell)
@@ -203,22 +482,86 @@ class MinesweeperAI():
                     undeterminedCells.append((i, j))
 
         newSentence = Sentence(undeterminedCells, count - countMines)
-
-        self.knowledge.append(newSentence)
-
-        for sentence in self.knowledge:
-            if sentence.known_mines():
-                for cell in sentence.known_mines().copy():
+        self.add_sentence(newSentence)
+        self.infer()
+
+        # Combine overlapping sentences in the components that changed
+        while self.dirty:
+            dirty = self.dirty
+            self.dirty = set()
+            for component in self.components(dirty):
+                mines, safes = self.eliminate(component)
+                for cell in mines:
                     self.mark_mine(cell)
-            if sentence.known_safes():
-                for cell in sentence.known_safes().copy():
+                for cell in safes:
                     self.mark_safe(cell)
+            self.infer()
 
-        for sentence in self.knowledge:
-            if newSentence.cells.issubset(sentence.cells) and sentence.count > 0 and newSentence.count > 0 and newSentence != sentence:
-                newSubset = sentence.cells.difference(newSentence.cells)
-                newSentenceSubset = Sentence(list(newSubset), sentence.count - newSentence.count)
-                self.knowledge.append(newSentenceSubset)
+    def eliminate(self, cells):
+        """
+        Treats the sentences about a component's cells as linear equations
+        over 0/1 mine variables and runs integer Gaussian elimination.
+        Returns the sets of cells that the reduced equations force to be
+        mines and to be safe.
+
+        In a reduced equation, if the count equals the sum of its positive
+        coefficients, every cell with a positive coefficient is a mine and
+        every cell with a negative one is safe; if it equals the sum of its
+        negative coefficients, the reverse holds.
+        """
+        sentence_ids = set()
+        for cell in cells:
+            sentence_ids.update(self.index[cell])
+        column = {cell: c for c, cell in enumerate(cells)}
+
+        # One row per sentence, with the count as the last entry
+        rows = []
+        for sentence_id in sentence_ids:
+            sentence = self.knowledge[sentence_id]
+            row = [0] * (len(cells) + 1)
+            for cell in sentence.cells:
+                row[column[cell]] = 1
+            row[-1] = sentence.count
+            rows.append(row)
+
+        # Reduce to row echelon form, keeping entries integral
+        pivot = 0
+        for c in range(len(cells)):
+            for r in range(pivot, len(rows)):
+                if rows[r][c]:
+                    break
+            else:
+                continue
+            rows[pivot], rows[r] = rows[r], rows[pivot]
+            a = rows[pivot][c]
+            for r in range(len(rows)):
+                b = rows[r][c]
+                if r == pivot or not b:
+                    continue
+                row = [a * x - b * y for x, y in zip(rows[r], rows[pivot])]
+                divisor = math.gcd(*row)
+                rows[r] = [x // divisor for x in row] if divisor else row
+            pivot += 1
+
+        mines = set()
+        safes = set()
+        for row in rows:
+            positive = sum(x for x in row[:-1] if x > 0)
+            negative = sum(x for x in row[:-1] if x < 0)
+            if positive == negative == 0:
+                continue
+            if row[-1] == positive:
+                high, low = mines, safes
+            elif row[-1] == negative:
+                high, low = safes, mines
+            else:
+                continue
+            for cell, x in zip(cells, row):
+                if x > 0:
+                    high.add(cell)
+                elif x < 0:
+                    low.add(cell)
+        return mines, safes
 
     def make_safe_move(self):
         """
@@ -229,9 +572,10 @@ class MinesweeperAI():
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
         """
-        for cell in self.safes:
-            if cell not in self.moves_made:
-                return cell
+        while self.pending and self.pending[0] in self.moves_made:
+            self.pending.popleft()
+        if self.pending:
+            return self.pending[0]
         return None
 
     def make_random_move(self):
@@ -241,13 +585,324 @@ class MinesweeperAI():
             1) have not already been chosen, and
             2) are not known to be mines
         """
-        possibleMoves = []
-        for i in range(self.height):
-            for j in range(self.width):
-                if (i, j) not in self.moves_made and (i, j) not in self.mines:
-                    possibleMoves.append((i, j))
-        if len(possibleMoves) != 0:
-            return random.choice(possibleMoves)
-        else:
+        if self.remaining == 0:
             return None
+        position = random.randrange(self.remaining)
+        return divmod(self.slots.get(position, position), self.width)
 
+    def discard_unknown(self, cell):
+        """
+        Removes a cell from the cells available to make_random_move, by
+        swapping it with the last available position.
+        """
+        index = cell[0] * self.width + cell[1]
+        position = self.positions.pop(index, index)
+        last = self.remaining - 1
+        last_index = self.slots.pop(last, last)
+        if position != last:
+            self.slots[position] = last_index
+            self.positions[last_index] = position
+        self.remaining -= 1
+
+    def unknown_cells(self):
+        """
+        Returns the cells that have not been chosen and are not known
+        to be mines or safe.
+        """
+        cells = []
+        for position in range(self.remaining):
+            cell = divmod(self.slots.get(position, position), self.width)
+            if cell not in self.safes:
+                cells.append(cell)
+        return cells
+
+    def make_probable_move(self):
+        """
+        Returns the move least likely to be a mine among cells that have
+        not been chosen and are not known to be mines, breaking ties at
+        random, or None if there are no such cells.
+        """
+        probabilities, others, density = self.frontier_probabilities()
+        if not probabilities and not others:
+            return None
+        lowest = min(probabilities.values(), default=1)
+        if others:
+            lowest = min(lowest, density)
+        best = [cell for cell, probability in probabilities.items()
+                if probability == lowest]
+
+        # Cells off the frontier all share the same probability
+        if others and density == lowest:
+            choice = random.randrange(len(best) + others)
+            if choice >= len(best):
+                return self.random_unmentioned_cell()
+        return random.choice(best)
+
+    def random_unmentioned_cell(self):
+        """
+        Returns a random cell that has not been chosen, is not known to
+        be a mine or safe, and is not mentioned by any sentence. Such a
+        cell must exist.
+        """
+        for _ in range(64):
+            cell = self.make_random_move()
+            if cell not in self.safes and not self.index.get(cell):
+                return cell
+        return random.choice([
+            cell for cell in self.unknown_cells() if not self.index.get(cell)
+        ])
+
+    def mine_probabilities(self):
+        """
+        Returns the probability that each unknown cell is a mine, as
+        computed by frontier_probabilities.
+        """
+        probabilities, others, density = self.frontier_probabilities()
+        if others:
+            for cell in self.unknown_cells():
+                if cell not in probabilities:
+                    probabilities[cell] = density
+        return probabilities
+
+    def frontier_probabilities(self):
+        """
+        Returns the probability that each unknown cell mentioned by a
+        sentence is a mine, the number of other unknown cells, and the
+        probability they share.
+
+        Cells mentioned by sentences are split into independent
+        components linked by shared sentences, and each component's
+        consistent mine configurations are counted by number of mines.
+        Combinations of components are weighted by the number of ways to
+        place the remaining mines among the cells no sentence mentions,
+        when the total number of mines is known. These weights are too
+        large for floats, so they are combined as logarithms: a forward
+        pass accumulates the mine counts of the components before each
+        one, and a backward pass those of the components after it
+        together with the ways to place the other mines.
+        """
+        frontier = [cell for cell, ids in self.index.items() if ids]
+
+        # Every chosen cell is safe, so the other known safes are the
+        # unknown cells still counted in self.remaining
+        unknown = self.remaining - (len(self.safes) - len(self.moves_made))
+        others = unknown - len(frontier)
+
+        components = []
+        for cells in self.components(frontier):
+            counts, cell_counts = self.count_configurations(cells)
+            ways = numpy.full(max(counts, default=0) + 1, -numpy.inf)
+            for mines, count in counts.items():
+                ways[mines] = math.log(count)
+            components.append((cells, counts, cell_counts, ways))
+
+        # Log of the ways to place the other mines off the frontier, by
+        # number of mines on the frontier
+        most = sum(len(ways) - 1 for _, _, _, ways in components)
+        outside = numpy.zeros(most + 1)
+        if self.total_mines is not None:
+            remaining = self.total_mines - len(self.mines)
+            for mines in range(most + 1):
+                rest = remaining - mines
+                if 0 <= rest <= others:
+                    outside[mines] = (math.lgamma(others + 1)
+                                      - math.lgamma(rest + 1)
+                                      - math.lgamma(others - rest + 1))
+                else:
+                    outside[mines] = -numpy.inf
+
+        # before[i][t]: log ways for components before i to hold t mines
+        before = [numpy.zeros(1)]
+        for _, _, _, ways in components:
+            before.append(log_convolve(before[-1], ways))
+
+        # after[i][t]: log ways to complete the board given t mines in
+        # the components before i
+        after = [outside]
+        for _, _, _, ways in reversed(components):
+            size = len(after[-1]) - len(ways) + 1
+            after.append(numpy.logaddexp.reduce([
+                ways[mines] + after[-1][mines:mines + size]
+                for mines in range(len(ways))
+            ], axis=0))
+        after.reverse()
+
+        probabilities = dict()
+        for i, (cells, counts, cell_counts, ways) in enumerate(components):
+            size = len(before[i])
+            weights = numpy.array([
+                ways[mines] + numpy.logaddexp.reduce(
+                    before[i] + after[i + 1][mines:mines + size]
+                )
+                for mines in range(len(ways))
+            ])
+            if numpy.isneginf(weights).all():
+                for cell in cells:
+                    probabilities[cell] = 0.5
+                continue
+            weights = numpy.exp(weights - weights.max())
+            weights /= weights.sum()
+            for cell in cells:
+                probabilities[cell] = float(sum(
+                    weights[mines] * cell_counts[mines][cell] / counts[mines]
+                    for mines in counts
+                ))
+
+        # Cells no sentence mentions share the remaining mines equally
+        density = None
+        if others:
+            if self.total_mines is None:
+                density = (sum(probabilities.values()) / len(probabilities)
+                           if probabilities else 0.5)
+            else:
+                weights = before[-1] + outside
+                if numpy.isneginf(weights).all():
+                    density = 0.5
+                else:
+                    weights = numpy.exp(weights - weights.max())
+                    mines = numpy.arange(len(weights))
+                    expected = (weights * (remaining - mines)).sum()
+                    density = float(expected / weights.sum() / others)
+
+        return probabilities, others, density
+
+    def components(self, cells):
+        """
+        Returns the groups of cells linked through shared sentences that
+        contain any of `cells`. Cells no sentence mentions are skipped.
+        """
+        seen = set()
+        groups = []
+        for start in cells:
+            if start in seen or not self.index.get(start):
+                continue
+            seen.add(start)
+            group = []
+            frontier = [start]
+            while frontier:
+                cell = frontier.pop()
+                group.append(cell)
+                for sentence_id in self.index[cell]:
+                    for other in self.knowledge[sentence_id].cells:
+                        if other not in seen:
+                            seen.add(other)
+                            frontier.append(other)
+            groups.append(group)
+        return groups
+
+    def count_configurations(self, cells):
+        """
+        Counts the mine configurations of a component consistent with
+        the knowledge base. Returns a dictionary from number of mines to
+        configuration count, and one from number of mines to how many of
+        those configurations make each cell a mine.
+
+        Configurations are enumerated by backtracking. If that takes more
+        than MAX_SEARCH_NODES steps, counts come instead from SAMPLES
+        randomised searches that each keep the first configuration found.
+        """
+        sentence_ids = set()
+        for cell in cells:
+            sentence_ids.update(self.index[cell])
+
+        # Visit cells sentence by sentence, so constraints close early
+        order = list(dict.fromkeys(
+            cell for sentence_id in sorted(sentence_ids)
+            for cell in sorted(self.knowledge[sentence_id].cells)
+        ))
+
+        counts = dict()
+        cell_counts = dict()
+
+        def record(mines):
+            counts[len(mines)] = counts.get(len(mines), 0) + 1
+            mine_counts = cell_counts.setdefault(
+                len(mines), dict.fromkeys(order, 0)
+            )
+            for cell in mines:
+                mine_counts[cell] += 1
+
+        if not self.search(order, sentence_ids, record, False):
+            counts.clear()
+            cell_counts.clear()
+            for _ in range(MinesweeperAI.SAMPLES):
+                self.search(order, sentence_ids, record, True)
+
+        return counts, cell_counts
+
+    def search(self, order, sentence_ids, record, randomize):
+        """
+        Backtracks over mine assignments to the cells in `order`, calling
+        `record` with the list of mines of every assignment consistent
+        with the sentences. A randomised search tries values in random
+        order and stops at the first consistent assignment. Returns False
+        if the search took more than MAX_SEARCH_NODES steps.
+        """
+        # Mines still needed and cells still unassigned in each sentence
+        needed = {i: self.knowledge[i].count for i in sentence_ids}
+        unassigned = {i: len(self.knowledge[i].cells) for i in sentence_ids}
+
+        # Stack of cells assigned so far, with the values left to try
+        mines = []
+        stack = []
+        nodes = 0
+        position = 0
+        values = None
+
+        while True:
+            if values is None:
+                if position == len(order):
+                    record(mines)
+                    if randomize:
+                        return True
+                    values = []
+                else:
+                    values = [False, True]
+                    if randomize:
+                        random.shuffle(values)
+
+            # Backtrack once a cell has no values left to try
+            if not values:
+                if not stack:
+                    return True
+                position -= 1
+                cell, value, values = stack.pop()
+                if value:
+                    mines.pop()
+                for i in self.index[cell]:
+                    unassigned[i] += 1
+                    needed[i] += value
+                continue
+
+            nodes += 1
+            if nodes > MinesweeperAI.MAX_SEARCH_NODES:
+                return False
+
+            # Assign the next value if no sentence is violated
+            cell = order[position]
+            value = values.pop()
+            consistent = True
+            for i in self.index[cell]:
+                if not 0 <= needed[i] - value <= unassigned[i] - 1:
+                    consistent = False
+            if not consistent:
+                continue
+            for i in self.index[cell]:
+                unassigned[i] -= 1
+                needed[i] -= value
+            if value:
+                mines.append(cell)
+            stack.append((cell, value, values))
+            position += 1
+            values = None
+
+
+def log_convolve(a, b):
+    """
+    Returns the convolution of two arrays of logarithms, as logarithms:
+    entry t is the log of the sum over x + y = t of exp(a[x] + b[y]).
+    """
+    rows = numpy.full((len(b), len(a) + len(b) - 1), -numpy.inf)
+    for y in range(len(b)):
+        rows[y, y:y + len(a)] = a + b[y]
+    return numpy.logaddexp.reduce(rows, axis=0)
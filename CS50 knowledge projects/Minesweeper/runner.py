@@ -1,6 +1,5 @@
 import pygame
 import sys
-import time
 
 from minesweeper import Minesweeper, MinesweeperAI
 
@@ -8,6 +7,9 @@ HEIGHT = 8
 WIDTH = 8
 MINES = 8
 
+# Most frames drawn per second while events keep arriving
+FPS = 30
+
 # Colors
 BLACK = (0, 0, 0)
 GRAY = (180, 180, 180)
@@ -17,6 +19,7 @@ WHITE = (255, 255, 255)
 pygame.init()
 size = width, height = 600, 400
 screen = pygame.display.set_mode(size)
+clock = pygame.time.Clock()
 
 # Fonts
 OPEN_SANS = "assets/fonts/OpenSans-Regular.ttf"
@@ -37,9 +40,25 @@ flag = pygame.transform.scale(flag, (cell_size, cell_size))
 mine = pygame.image.load("assets/images/mine.png")
 mine = pygame.transform.scale(mine, (cell_size, cell_size))
 
+# Render each possible neighbor count once
+numbers = [smallFont.render(str(n), True, BLACK) for n in range(9)]
+
+# Buttons and the area showing whether the game was won or lost
+playButton = pygame.Rect((width / 4), (3 / 4) * height, width / 2, 50)
+aiButton = pygame.Rect(
+    (2 / 3) * width + BOARD_PADDING, (1 / 3) * height - 50,
+    (width / 3) - BOARD_PADDING * 2, 50
+)
+resetButton = pygame.Rect(
+    (2 / 3) * width + BOARD_PADDING, (1 / 3) * height + 20,
+    (width / 3) - BOARD_PADDING * 2, 50
+)
+statusRect = pygame.Rect(0, 0, (width / 3) - BOARD_PADDING * 2, 50)
+statusRect.center = ((5 / 6) * width, (2 / 3) * height)
+
 # Create game and AI agent
 game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
-ai = MinesweeperAI(height=HEIGHT, width=WIDTH)
+ai = MinesweeperAI(height=HEIGHT, width=WIDTH, mines=MINES)
 
 # Keep track of revealed cells, flagged cells, and if a mine was hit
 revealed = set()
@@ -49,174 +68,212 @@ lost = False
 # Show instructions initially
 instructions = True
 
-while True:
+# Redraw the whole screen on the next frame, otherwise only the cells
+# whose state changed and the status text if it changed
+redraw_all = True
+dirty = set()
+status = None
 
-    # Check if game quit
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            sys.exit()
 
-    screen.fill(BLACK)
+def cell_rect(cell):
+    """Returns the screen rectangle of a board cell."""
+    i, j = cell
+    return pygame.Rect(
+        board_origin[0] + j * cell_size,
+        board_origin[1] + i * cell_size,
+        cell_size, cell_size
+    )
 
-    # Show game instructions
-    if instructions:
 
-        # Title
-        title = largeFont.render("Play Minesweeper", True, WHITE)
-        titleRect = title.get_rect()
-        titleRect.center = ((width / 2), 50)
-        screen.blit(title, titleRect)
-
-        # Rules
-        rules = [
-            "Click a cell to reveal it.",
-            "Right-click a cell to mark it as a mine.",
-            "Mark all mines successfully to win!"
-        ]
-        for i, rule in enumerate(rules):
-            line = smallFont.render(rule, True, WHITE)
-            lineRect = line.get_rect()
-            lineRect.center = ((width / 2), 150 + 30 * i)
-            screen.blit(line, lineRect)
-
-        # Play game button
-        buttonRect = pygame.Rect((width / 4), (3 / 4) * height, width / 2, 50)
-        buttonText = mediumFont.render("Play Game", True, BLACK)
-        buttonTextRect = buttonText.get_rect()
-        buttonTextRect.center = buttonRect.center
-        pygame.draw.rect(screen, WHITE, buttonRect)
-        screen.blit(buttonText, buttonTextRect)
+def cell_at(position):
+    """Returns the board cell under a screen position, or None."""
+    x, y = position
+    i = (y - board_origin[1]) // cell_size
+    j = (x - board_origin[0]) // cell_size
+    if 0 <= i < HEIGHT and 0 <= j < WIDTH:
+        return (i, j)
+    return None
 
-        # Check if play button clicked
-        click, _, _ = pygame.mouse.get_pressed()
-        if click == 1:
-            mouse = pygame.mouse.get_pos()
-            if buttonRect.collidepoint(mouse):
-                instructions = False
-                time.sleep(0.3)
 
-        pygame.display.flip()
-        continue
+def draw_button(rect, label):
+    """Draws a white button with a centered label."""
+    pygame.draw.rect(screen, WHITE, rect)
+    text = mediumFont.render(label, True, BLACK)
+    textRect = text.get_rect()
+    textRect.center = rect.center
+    screen.blit(text, textRect)
 
-    # Draw board
-    cells = []
-    for i in range(HEIGHT):
-        row = []
-        for j in range(WIDTH):
 
-            # Draw rectangle for cell
-            rect = pygame.Rect(
-                board_origin[0] + j * cell_size,
-                board_origin[1] + i * cell_size,
-                cell_size, cell_size
-            )
-            pygame.draw.rect(screen, GRAY, rect)
-            pygame.draw.rect(screen, WHITE, rect, 3)
-
-            # Add a mine, flag, or number if needed
-            if game.is_mine((i, j)) and lost:
-                screen.blit(mine, rect)
-            elif (i, j) in flags:
-                screen.blit(flag, rect)
-            elif (i, j) in revealed:
-                neighbors = smallFont.render(
-                    str(game.nearby_mines((i, j))),
-                    True, BLACK
-                )
-                neighborsTextRect = neighbors.get_rect()
-                neighborsTextRect.center = rect.center
-                screen.blit(neighbors, neighborsTextRect)
-
-            row.append(rect)
-        cells.append(row)
-
-    # AI Move button
-    aiButton = pygame.Rect(
-        (2 / 3) * width + BOARD_PADDING, (1 / 3) * height - 50,
-        (width / 3) - BOARD_PADDING * 2, 50
-    )
-    buttonText = mediumFont.render("AI Move", True, BLACK)
-    buttonRect = buttonText.get_rect()
-    buttonRect.center = aiButton.center
-    pygame.draw.rect(screen, WHITE, aiButton)
-    screen.blit(buttonText, buttonRect)
-
-    # Reset button
-    resetButton = pygame.Rect(
-        (2 / 3) * width + BOARD_PADDING, (1 / 3) * height + 20,
-        (width / 3) - BOARD_PADDING * 2, 50
-    )
-    buttonText = mediumFont.render("Reset", True, BLACK)
-    buttonRect = buttonText.get_rect()
-    buttonRect.center = resetButton.center
-    pygame.draw.rect(screen, WHITE, resetButton)
-    screen.blit(buttonText, buttonRect)
+def draw_instructions():
+    """Draws the instructions screen."""
+    screen.fill(BLACK)
 
-    # Display text
-    text = "Lost" if lost else "Won" if game.mines == flags else ""
-    text = mediumFont.render(text, True, WHITE)
+    # Title
+    title = largeFont.render("Play Minesweeper", True, WHITE)
+    titleRect = title.get_rect()
+    titleRect.center = ((width / 2), 50)
+    screen.blit(title, titleRect)
+
+    # Rules
+    rules = [
+        "Click a cell to reveal it.",
+        "Right-click a cell to mark it as a mine.",
+        "Mark all mines successfully to win!"
+    ]
+    for i, rule in enumerate(rules):
+        line = smallFont.render(rule, True, WHITE)
+        lineRect = line.get_rect()
+        lineRect.center = ((width / 2), 150 + 30 * i)
+        screen.blit(line, lineRect)
+
+    # Play game button
+    draw_button(playButton, "Play Game")
+
+
+def draw_cell(cell):
+    """Draws one board cell and returns its rectangle."""
+    rect = cell_rect(cell)
+    pygame.draw.rect(screen, GRAY, rect)
+    pygame.draw.rect(screen, WHITE, rect, 3)
+
+    # Add a mine, flag, or number if needed
+    if game.is_mine(cell) and lost:
+        screen.blit(mine, rect)
+    elif cell in flags:
+        screen.blit(flag, rect)
+    elif cell in revealed:
+        neighbors = numbers[game.nearby_mines(cell)]
+        neighborsTextRect = neighbors.get_rect()
+        neighborsTextRect.center = rect.center
+        screen.blit(neighbors, neighborsTextRect)
+
+    return rect
+
+
+def draw_status():
+    """Draws whether the game was won or lost and returns its area."""
+    pygame.draw.rect(screen, BLACK, statusRect)
+    text = mediumFont.render(status, True, WHITE)
     textRect = text.get_rect()
-    textRect.center = ((5 / 6) * width, (2 / 3) * height)
+    textRect.center = statusRect.center
     screen.blit(text, textRect)
+    return statusRect
+
+
+def draw_game():
+    """Draws the whole game screen."""
+    screen.fill(BLACK)
+    for i in range(HEIGHT):
+        for j in range(WIDTH):
+            draw_cell((i, j))
+    draw_button(aiButton, "AI Move")
+    draw_button(resetButton, "Reset")
+    draw_status()
+
 
+while True:
+
+    # Sleep until an event arrives, then handle every queued event
+    events = [pygame.event.wait()] + pygame.event.get()
     move = None
 
-    left, _, right = pygame.mouse.get_pressed()
+    for event in events:
 
-    # Check for a right-click to toggle flagging
-    if right == 1 and not lost:
-        mouse = pygame.mouse.get_pos()
-        for i in range(HEIGHT):
-            for j in range(WIDTH):
-                if cells[i][j].collidepoint(mouse) and (i, j) not in revealed:
-                    if (i, j) in flags:
-                        flags.remove((i, j))
-                    else:
-                        flags.add((i, j))
-                    time.sleep(0.2)
+        # Check if game quit
+        if event.type == pygame.QUIT:
+            sys.exit()
+
+        # Redraw everything if the window needs repainting
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            redraw_all = True
+
+        elif event.type != pygame.MOUSEBUTTONDOWN:
+            continue
+
+        # Check if play button clicked
+        elif instructions:
+            if event.button == 1 and playButton.collidepoint(event.pos):
+                instructions = False
+                redraw_all = True
+
+        # Check for a right-click to toggle flagging
+        elif event.button == 3 and not lost:
+            cell = cell_at(event.pos)
+            if cell is not None and cell not in revealed:
+                if cell in flags:
+                    flags.remove(cell)
+                else:
+                    flags.add(cell)
+                dirty.add(cell)
 
-    elif left == 1:
-        mouse = pygame.mouse.get_pos()
+        elif event.button == 1:
 
-        # If AI button clicked, make an AI move
-        if aiButton.collidepoint(mouse) and not lost:
-            move = ai.make_safe_move()
-            if move is None:
-                move = ai.make_random_move()
+            # If AI button clicked, make an AI move
+            if aiButton.collidepoint(event.pos) and not lost:
+                move = ai.make_safe_move()
                 if move is None:
-                    flags = ai.mines.copy()
-                    print("No moves left to make.")
+                    move = ai.make_probable_move()
+                    if move is None:
+                        dirty.update(flags ^ ai.mines)
+                        flags = ai.mines.copy()
+                        print("No moves left to make.")
+                    else:
+                        print("No known safe moves, AI making least risky move.")
                 else:
-                    print("No known safe moves, AI making random move.")
+                    print("AI making safe move.")
+
+            # Reset game state
+            elif resetButton.collidepoint(event.pos):
+                game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
+                ai = MinesweeperAI(height=HEIGHT, width=WIDTH, mines=MINES)
+                revealed = set()
+                flags = set()
+                lost = False
+                move = None
+                redraw_all = True
+
+            # User-made move
+            elif not lost:
+                cell = cell_at(event.pos)
+                if (cell is not None
+                        and cell not in flags
+                        and cell not in revealed):
+                    move = cell
+
+        # Make move and update AI knowledge
+        if move:
+            if game.is_mine(move):
+                lost = True
+                dirty.update(game.mines)
             else:
-                print("AI making safe move.")
-            time.sleep(0.2)
-
-        # Reset game state
-        elif resetButton.collidepoint(mouse):
-            game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
-            ai = MinesweeperAI(height=HEIGHT, width=WIDTH)
-            revealed = set()
-            flags = set()
-            lost = False
-            continue
+                nearby = game.nearby_mines(move)
+                revealed.add(move)
+                dirty.add(move)
+                ai.add_knowledge(move, nearby)
+            move = None
+
+    if instructions:
+        if redraw_all:
+            draw_instructions()
+            pygame.display.flip()
+            redraw_all = False
+        clock.tick(FPS)
+        continue
+
+    # Display text
+    text = "Lost" if lost else "Won" if game.mines == flags else ""
 
-        # User-made move
-        elif not lost:
-            for i in range(HEIGHT):
-                for j in range(WIDTH):
-                    if (cells[i][j].collidepoint(mouse)
-                            and (i, j) not in flags
-                            and (i, j) not in revealed):
-                        move = (i, j)
-
-    # Make move and update AI knowledge
-    if move:
-        if game.is_mine(move):
-            lost = True
-        else:
-            nearby = game.nearby_mines(move)
-            revealed.add(move)
-            ai.add_knowledge(move, nearby)
-
-    pygame.display.flip()
+    if redraw_all:
+        status = text
+        draw_game()
+        pygame.display.flip()
+    else:
+        rects = [draw_cell(cell) for cell in dirty]
+        if text != status:
+            status = text
+            rects.append(draw_status())
+        pygame.display.update(rects)
+
+    redraw_all = False
+    dirty = set()
+    clock.tick(FPS)
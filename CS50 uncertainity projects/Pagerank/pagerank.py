@@ -1,3 +1,6 @@
+import collections
+import concurrent.futures
+import json
 import os
 import random
 import re
@@ -7,11 +10,41 @@ import numpy
 DAMPING = 0.85
 SAMPLES = 10000
 
+# Iteration stops once the ranks change by less than this in total
+TOLERANCE = 1e-6
+
+# Random walks advanced together when sampling, and steps each one
+# takes before its pages are counted, so that where it started no
+# longer matters
+WALKERS = 1000
+BURN_IN = 50
+
+# A corpus in compressed sparse row form: `pages` lists page names, and
+# the pages linked to by page i are targets[offsets[i]:offsets[i + 1]],
+# given as indices into `pages`
+Graph = collections.namedtuple("Graph", ["pages", "offsets", "targets"])
+
+# Links in an HTML page
+LINK = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
+
+# Corpora with fewer pages than this are parsed without a process pool
+PARALLEL_PAGES = 1000
+
+# Directory inside a corpus where crawl_graph saves its link index
+INDEX = ".pagerank"
+
+# Smallest residual of a page that push_residuals pushes
+PUSH_THRESHOLD = 1e-10
+
+# Most page and teleport distribution pairs personalized_pagerank
+# solves at once, bounding its memory use
+BATCH_ENTRIES = 2 ** 22
+
 
 def main():
     if len(sys.argv) != 2:
         sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
+    corpus = crawl_graph(sys.argv[1])
     ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
     for page in sorted(ranks):
@@ -28,25 +61,201 @@ def crawl(directory):
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
     """
-    pages = dict()
-
-    # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
-
-    # Only include links to other pages in the corpus
-    for filename in pages:
-        pages[filename] = set(
-            link for link in pages[filename]
-            if link in pages
+    graph = crawl_graph(directory, index=None)
+    return {
+        page: set(
+            graph.pages[target]
+            for target in graph.targets[graph.offsets[i]:graph.offsets[i + 1]]
+        )
+        for i, page in enumerate(graph.pages)
+    }
+
+
+def crawl_graph(directory, processes=None, index=INDEX):
+    """
+    Parse a directory of HTML pages into a Graph of the links between
+    them, with pages in sorted order.
+
+    The links found are saved in the `index` subdirectory along with
+    each file's modification time and size, and later crawls only parse
+    files that were added or changed since. If the index cannot be
+    saved, as in a read-only corpus, the crawl goes on without it. Pass
+    index=None to parse every file without saving anything. Large sets
+    of files are parsed by a pool of `processes` processes, defaulting
+    to one per CPU.
+    """
+    stats = dict()
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(".html") and entry.is_file():
+                stat = entry.stat()
+                stats[entry.name] = [stat.st_mtime_ns, stat.st_size]
+    pages = sorted(stats)
+
+    if index is None:
+        links = parse_pages(directory, pages, processes)
+        return build_graph(pages, links)
+
+    # Reuse the saved links of every file that has not changed
+    path = os.path.join(directory, index)
+    saved = load_index(path)
+    if saved is None:
+        saved = ({}, [], numpy.zeros(1, dtype=numpy.int64),
+                 numpy.zeros(0, dtype=numpy.int64))
+    files, names, offsets, targets = saved
+    rows = {
+        page: files[page][1] for page in pages
+        if files.get(page, (None,))[0] == stats[page]
+    }
+    changed = [page for page in pages if page not in rows]
+    parsed = dict(zip(changed, parse_pages(directory, changed, processes)))
+
+    # Saved files are in sorted order, so an unchanged corpus can use
+    # the saved arrays as they are
+    if changed or len(files) != len(pages):
+        names, offsets, targets = merge_links(
+            pages, rows, parsed, names, offsets, targets
         )
+        try:
+            save_index(path, pages, stats, names, offsets, targets)
+        except OSError:
+            pass
+
+    # Map linked names to page indices, dropping links outside the corpus
+    page_index = {page: i for i, page in enumerate(pages)}
+    name_pages = numpy.array(
+        [page_index.get(name, -1) for name in names], dtype=numpy.int64
+    )
+    mapped = name_pages[targets]
+    kept = numpy.concatenate(([0], numpy.cumsum(mapped >= 0)))
+    return Graph(pages, kept[offsets], mapped[mapped >= 0])
+
+
+def parse_pages(directory, pages, processes=None):
+    """
+    Return the links of each of `pages` in a directory, in a process
+    pool if there are at least PARALLEL_PAGES of them.
+    """
+    paths = [os.path.join(directory, page) for page in pages]
+    if len(paths) < PARALLEL_PAGES:
+        return [parse_page(path) for path in paths]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    chunksize = max(1, len(paths) // (4 * processes))
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(parse_page, paths, chunksize=chunksize))
+
 
-    return pages
+def merge_links(pages, rows, parsed, names, offsets, targets):
+    """
+    Combine the links of every page into sorted link names and CSR
+    arrays over them, in the order of `pages`. `rows` maps unchanged
+    pages to their row in the saved `offsets` and `targets` arrays,
+    which index into `names`, and `parsed` holds the newly parsed link
+    names of the rest.
+    """
+    rows = {
+        page: numpy.asarray(targets[offsets[row]:offsets[row + 1]])
+        for page, row in rows.items()
+    }
+    used = numpy.unique(numpy.concatenate(
+        [numpy.zeros(0, dtype=numpy.int64)] + list(rows.values())
+    ))
+    new_names = set(names[i] for i in used.tolist())
+    for links in parsed.values():
+        new_names.update(links)
+    new_names = sorted(new_names)
+    name_index = {name: i for i, name in enumerate(new_names)}
+
+    # Translate saved rows from old name indices to new ones
+    renumber = numpy.zeros(len(names), dtype=numpy.int64)
+    renumber[used] = [name_index[names[i]] for i in used.tolist()]
+
+    offsets = numpy.zeros(len(pages) + 1, dtype=numpy.int64)
+    targets = []
+    for i, page in enumerate(pages):
+        if page in rows:
+            row = renumber[rows[page]]
+        else:
+            row = numpy.array(
+                sorted(name_index[link] for link in parsed[page]),
+                dtype=numpy.int64
+            )
+        offsets[i + 1] = offsets[i] + len(row)
+        targets.append(row)
+    targets = numpy.concatenate(
+        [numpy.zeros(0, dtype=numpy.int64)] + targets
+    )
+    return new_names, offsets, targets
+
+
+def load_index(path):
+    """
+    Return the saved files, link names and CSR arrays of a link index,
+    or None if there is no usable index. `files` maps each file name to
+    its modification time and size and its row in the arrays, which are
+    memory-mapped rather than read.
+    """
+    try:
+        with open(os.path.join(path, "files.json")) as f:
+            saved = json.load(f)
+        offsets = numpy.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        targets = numpy.load(os.path.join(path, "targets.npy"), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+    # An index interrupted while saving has mismatched parts
+    if (len(offsets) != len(saved["files"]) + 1
+            or offsets[-1] != len(targets)
+            or saved["edges"] != len(targets)):
+        return None
+    files = {
+        name: (stat, row) for row, (name, stat) in enumerate(saved["files"])
+    }
+    return files, saved["names"], offsets, targets
+
+
+def save_index(path, pages, stats, names, offsets, targets):
+    """Save a link index, replacing each file in one step."""
+    os.makedirs(path, exist_ok=True)
+    for name, array in (("offsets", offsets), ("targets", targets)):
+        temporary = os.path.join(path, f"{name}.tmp.npy")
+        numpy.save(temporary, array)
+        os.replace(temporary, os.path.join(path, f"{name}.npy"))
+    temporary = os.path.join(path, "files.json.tmp")
+    with open(temporary, "w") as f:
+        json.dump({
+            "files": [[page, stats[page]] for page in pages],
+            "names": names,
+            "edges": len(targets),
+        }, f)
+    os.replace(temporary, os.path.join(path, "files.json"))
+
+
+def parse_page(path):
+    """Return the set of pages an HTML file links to, other than itself."""
+    with open(path) as f:
+        links = set(LINK.findall(f.read()))
+    links.discard(os.path.basename(path))
+    return links
+
+
+def build_graph(pages, links):
+    """
+    Return a Graph of `pages`, given in sorted order, where `links`
+    gives the names of the pages each one links to. Links to pages
+    outside the corpus are dropped.
+    """
+    index = {page: i for i, page in enumerate(pages)}
+    offsets = numpy.zeros(len(pages) + 1, dtype=numpy.int64)
+    targets = []
+    for i, page_links in enumerate(links):
+        page_targets = sorted(
+            index[link] for link in page_links if link in index
+        )
+        offsets[i + 1] = offsets[i] + len(page_targets)
+        targets.extend(page_targets)
+    return Graph(pages, offsets, numpy.array(targets, dtype=numpy.int64))
 
 
 def transition_model(corpus, page, damping_factor):
@@ -87,31 +296,70 @@ def sample_pagerank(corpus, damping_factor, n):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
-    """
-    # choose a random sample
-    sample = random.choice(list(corpus.keys()))
 
-    # samples list for storing the samples
-    samples = [sample]
-    # Initialize an empty dictionary to keep the rank of each page
-    ranks = dict()
-
-    for sample_n in range(n - 1):
-        distribution = transition_model(corpus, sample, damping_factor)
-        available_pages = list(distribution.keys())
-        probabilities = list(distribution.values())
-        sample = numpy.random.choice(available_pages, p=probabilities)
-        samples.append(sample)
+    `corpus` may also be a Graph.
+    """
+    graph = link_graph(corpus)
+    counts = random_walk(graph, damping_factor, n)
+    return dict(zip(graph.pages, (counts / n).tolist()))
 
-    # count the frequency of each page in the corpus based on the samples list and add to the ranks list.
-    for page in corpus.keys():
-        page_count = samples.count(page) / n
-        ranks[page] = page_count
 
-    return ranks
+def random_walk(graph, damping_factor, n, walkers=WALKERS, burn_in=BURN_IN):
+    """
+    Return how many times each page of a Graph is visited in `n` samples
+    from random surfers following the transition model.
+
+    Many independent surfers advance in lock-step, each step choosing
+    all their next pages with a few array operations: a surfer follows
+    a random link from its page with probability `damping_factor`, and
+    otherwise, or if its page has no links, moves to a random page.
+    Surfers start at random pages and are only counted after `burn_in`
+    steps.
+    """
+    generator = numpy.random.default_rng(random.getrandbits(64))
+    pages = len(graph.pages)
+    degrees = numpy.diff(graph.offsets)
+    walkers = max(1, min(walkers, n))
+
+    current = generator.integers(pages, size=walkers)
+    counts = numpy.zeros(pages, dtype=numpy.int64)
+    remaining = n
+    step = 0
+    while remaining > 0:
+        degree = degrees[current]
+        follow = (generator.random(walkers) < damping_factor) & (degree > 0)
+
+        # Surfers not following a link jump to a random page
+        following = current[follow]
+        current = generator.integers(pages, size=walkers)
+        current[follow] = graph.targets[
+            graph.offsets[following]
+            + (generator.random(len(following)) * degree[follow]).astype(
+                numpy.int64
+            )
+        ]
+
+        step += 1
+        if step > burn_in:
+            counted = min(walkers, remaining)
+            counts += numpy.bincount(current[:counted], minlength=pages)
+            remaining -= counted
+
+    return counts
+
+
+def link_graph(corpus):
+    """
+    Return the corpus as a Graph, with pages in sorted order. A Graph
+    is returned unchanged.
+    """
+    if isinstance(corpus, Graph):
+        return corpus
+    pages = sorted(corpus)
+    return build_graph(pages, (corpus[page] for page in pages))
 
 
-def iterate_pagerank(corpus, damping_factor):
+def iterate_pagerank(corpus, damping_factor, tolerance=TOLERANCE):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -119,78 +367,357 @@ def iterate_pagerank(corpus, damping_factor):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    Iteration stops once the ranks change by less than `tolerance`
+    in total (L1 distance) between two iterations. `corpus` may also
+    be a Graph.
     """
-    # Initialize an empty dictionary to store the rank of each page.
-    ranks = dict()
+    graph = link_graph(corpus)
+    ranks = power_iteration(graph, damping_factor, tolerance)
+    return dict(zip(graph.pages, ranks.tolist()))
 
-    # Variable to keep track of number of pages
-    N_pages = len(corpus.keys())
 
-    # Variable to keep track of iteration
-    iterate = True
+def power_iteration(graph, damping_factor, tolerance=TOLERANCE, ranks=None):
+    """
+    Return the PageRank vector of a Graph by power iteration, starting
+    from the vector `ranks` if given.
 
-    # Variable to keep track of probabilities
-    probability1 = (1 - damping_factor) / N_pages
-    probability2 = 0
+    Each iteration spreads every page's rank evenly over its links with
+    one bincount over all links. A page with no links is treated as
+    linking to every page, so instead of adding those links, the rank
+    of all such pages is pooled and spread evenly over every page.
+    """
+    n = len(graph.pages)
+    degrees = numpy.diff(graph.offsets)
+    sources = numpy.repeat(numpy.arange(n), degrees)
+    dangling = degrees == 0
+    degrees = numpy.maximum(degrees, 1)
+
+    # Otherwise all the pages start with the same page rank
+    if ranks is None:
+        ranks = numpy.full(n, 1 / n)
+    while True:
+        shares = ranks / degrees
+        new_ranks = damping_factor * numpy.bincount(
+            graph.targets, weights=shares[sources], minlength=n
+        )
+        new_ranks += ((1 - damping_factor)
+                      + damping_factor * ranks[dangling].sum()) / n
+        change = numpy.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        if change < tolerance:
+            return ranks
 
-    # Initialize an empty list to keep track of changes
-    changes = []
 
-    # All the pages start with the same page rank
-    for page in corpus.keys():
-        ranks[page] = 1 / N_pages
+def update_pagerank(corpus, damping_factor, ranks, added=(), removed=(),
+                    tolerance=TOLERANCE, push=False, index=None):
+    """
+    Return PageRank values for a corpus after adding and removing some
+    links, given its PageRank values `ranks` before the change.
+
+    `added` and `removed` are collections of (page, linked page) pairs,
+    and `corpus` is the corpus as it was before them. Iteration starts
+    from the previous ranks rather than from a uniform distribution, so
+    small changes converge in a few iterations. With `push`, the change
+    is first spread out from the pages whose links changed by
+    push_residuals, and iteration is skipped if that leaves the ranks
+    within `tolerance`.
+
+    `corpus` may also be a Graph, in which case `ranks` may be an array
+    in the order of its pages and an array is returned, and `index` may
+    map each page to its position, to save building it for every update.
+    """
+    graph = link_graph(corpus)
+    if index is None:
+        index = {page: i for i, page in enumerate(graph.pages)}
+    added = link_pairs(index, added)
+    removed = link_pairs(index, removed)
+    new = patch_links(graph, added, removed)
+
+    if isinstance(ranks, numpy.ndarray):
+        start = ranks.astype(float)
+    else:
+        start = numpy.array([ranks[page] for page in graph.pages], dtype=float)
+    if push:
+        changed = numpy.unique(numpy.concatenate((added[0], removed[0])))
+        residuals, reached = change_residuals(graph, new, damping_factor,
+                                              start, changed)
+        start = push_residuals(new, damping_factor, start, residuals,
+                               reached)
+    if not push or (numpy.abs(residuals).sum()
+                    >= (1 - damping_factor) * tolerance):
+        start = power_iteration(new, damping_factor, tolerance, start)
+
+    if isinstance(ranks, numpy.ndarray):
+        return start
+    return dict(zip(graph.pages, start.tolist()))
+
+
+def link_pairs(index, links):
+    """
+    Return arrays of the source and target indices of (page, linked
+    page) pairs, given the `index` of each page, leaving out links from
+    a page to itself.
+    """
+    try:
+        pairs = numpy.array(
+            [(index[page], index[link]) for page, link in links],
+            dtype=numpy.int64
+        ).reshape(-1, 2)
+    except KeyError as error:
+        raise ValueError(f"Unknown page: {error.args[0]}")
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    return pairs[:, 0], pairs[:, 1]
+
+
+def change_links(graph, added=(), removed=(), index=None):
+    """
+    Return a copy of a Graph with the (page, linked page) pairs in
+    `added` linked and those in `removed` unlinked, given the `index` of
+    each page if already built.
+    """
+    if index is None:
+        index = {page: i for i, page in enumerate(graph.pages)}
+    return patch_links(graph, link_pairs(index, added),
+                       link_pairs(index, removed))
 
-    # Iterate until no rank changes by more than 0.01 percent.
-    while iterate:
-        # Initialize a list to keep new ranks
-        new_ranks = []
 
-        for page in corpus.keys():
-            probability2 = 0
-            links = links_to_page(corpus, page)
-
-            for link in links:
-                if len(corpus[link]) != 0:
-                    num_links = len(corpus[link])
-                else:
-                    num_links = len(corpus.keys())
-                    probability2 += ranks[link] / num_links
-
-            probability2 = damping_factor * probability2
-
-            # Calculate the new pagerank
-            new_rank = probability1 + probability2
-
-            # Calculate how much the rank changed from the previous rank
-            changes.append(abs(new_rank - ranks[page]))
-
-            # Update the new ranks list
-            new_ranks.append(new_rank)
-
-        # Decides weather to keep iterating or not and updates the pagerank
-        if any(change >= 0.001 for change in changes):
-            changes = []
-            i = 0
-            for page in corpus.keys():
-                ranks[page] = new_ranks[i]
-                i += 1
-        else:
-            iterate = False
+def patch_links(graph, added, removed):
+    """
+    Return a copy of a Graph with the links in `added` linked and those
+    in `removed` unlinked, each given as arrays of source and target
+    indices from link_pairs.
 
-    return ranks
+    Only the rows of the pages whose links change are rebuilt, and the
+    rest of the targets are copied around them.
+    """
+    n = len(graph.pages)
+
+    # Each link of a changed page is a key of source * n + target, so
+    # sorting the keys sorts the links like the Graph
+    changed = numpy.unique(numpy.concatenate((added[0], removed[0])))
+    links, counts = page_link_indices(graph, changed)
+    keys = numpy.repeat(changed, counts) * n + graph.targets[links]
+    keys = keys[~numpy.isin(keys, removed[0] * n + removed[1])]
+    keys = numpy.unique(numpy.concatenate((keys, added[0] * n + added[1])))
+    new_counts = numpy.bincount(
+        numpy.searchsorted(changed, keys // n), minlength=len(changed)
+    )
+
+    degrees = numpy.diff(graph.offsets)
+    degrees[changed] = new_counts
+    offsets = numpy.concatenate(([0], numpy.cumsum(degrees)))
+
+    # Where each changed row starts once the old rows are deleted
+    starts = graph.offsets[changed] - (numpy.cumsum(counts) - counts)
+    targets = numpy.insert(
+        numpy.delete(graph.targets, links),
+        numpy.repeat(starts, new_counts), keys % n
+    )
+    return Graph(graph.pages, offsets.astype(numpy.int64, copy=False),
+                 targets.astype(numpy.int64, copy=False))
+
+
+def change_residuals(old, graph, damping_factor, ranks, changed):
+    """
+    Return the residuals of a PageRank vector `ranks` of Graph `old` for
+    Graph `graph`, which has different links only from pages `changed`,
+    and the pages linked from those pages before or after the change.
+
+    The residual of a page is how much its rank would change in one
+    iteration, and is only non-zero for the linked pages returned.
+    Changes in the rank spread by pages with no links are left out, as
+    they reach every page evenly and are made up for by push_residuals.
+    """
+    residuals = numpy.zeros(len(graph.pages))
+    reached = []
+    for links_graph, sign in ((old, -damping_factor), (graph, damping_factor)):
+        targets, counts = page_links(links_graph, changed)
+        shares = sign * ranks[changed] / numpy.maximum(counts, 1)
+        numpy.add.at(residuals, targets, numpy.repeat(shares, counts))
+        reached.append(targets)
+    return residuals, numpy.unique(numpy.concatenate(reached))
+
+
+def push_residuals(graph, damping_factor, ranks, residuals, pages,
+                   threshold=PUSH_THRESHOLD):
+    """
+    Return a PageRank vector for a Graph improved from the vector `ranks`
+    by pushing its `residuals`, which are modified in place and must
+    only be non-zero on `pages`. This is cheap when the residuals are
+    only large near a few pages, such as those whose links changed.
+
+    Pushing a page adds its residual to its rank and spreads
+    `damping_factor` of it over the residuals of the pages it links to,
+    like one iteration for that page alone. All the pages with a
+    residual above `threshold` are pushed together, and then those
+    among the pages they link to, until none are left or a tenth as
+    many links have been followed as one iteration over the whole Graph
+    would follow.
+
+    Pages with no links would spread their residual evenly over every
+    page, which only scales the result, so it is dropped instead and
+    the ranks are made to sum to 1 at the end.
+    """
+    ranks = ranks.copy()
+    budget = len(graph.targets) // 10
+    pushed = pages[numpy.abs(residuals[pages]) > threshold]
+    while len(pushed):
+        targets, counts = page_links(graph, pushed)
+        budget -= len(targets)
+        if budget < 0:
+            break
+
+        amounts = residuals[pushed]
+        ranks[pushed] += amounts
+        residuals[pushed] = 0
+        shares = damping_factor * amounts / numpy.maximum(counts, 1)
+        reached, inverse = numpy.unique(targets, return_inverse=True)
+        residuals[reached] += numpy.bincount(
+            inverse, weights=numpy.repeat(shares, counts),
+            minlength=len(reached)
+        )
+        pushed = reached[numpy.abs(residuals[reached]) > threshold]
 
+    return ranks / ranks.sum()
 
-def links_to_page(corpus, page):
-    """ Returns a list of pages that link to a certain page.
-    If a page has no links it is interpreted as having one link for every page in the corpus(including itself)
+
+def page_links(graph, pages):
+    """
+    Return the targets of all the links from an array of `pages` of a
+    Graph, in order, and the number of links from each page.
     """
-    links_of_page = []
+    links, counts = page_link_indices(graph, pages)
+    return graph.targets[links], counts
 
-    for p in corpus.keys():
-        if page in corpus[p] or len(corpus[p]) == 0:
-            links_of_page.append(p)
 
-    return links_of_page
+def page_link_indices(graph, pages):
+    """
+    Return the positions in the targets of a Graph of all the links from
+    an array of `pages`, in order, and the number of links from each page.
+    """
+    counts = numpy.diff(graph.offsets)[pages]
+    starts = numpy.cumsum(counts) - counts
+    links = (numpy.repeat(graph.offsets[pages] - starts, counts)
+             + numpy.arange(counts.sum()))
+    return links, counts
+
+
+def personalized_pagerank(corpus, damping_factor, teleports,
+                          tolerance=TOLERANCE, top=None):
+    """
+    Return personalized PageRank values for each of a list of teleport
+    distributions, in which a surfer not following a link, or on a page
+    with no links, jumps to a page chosen from that distribution rather
+    than uniformly from all pages.
+
+    Each teleport distribution is a dictionary from pages to weights,
+    or a collection of pages to choose from equally. Return a list with
+    one dictionary of PageRank values per distribution, or if `top` is
+    given, of just the `top` highest ranked pages, highest first.
+    `corpus` may also be a Graph.
+
+    Distributions are solved in blocks of BATCH_ENTRIES page and
+    distribution pairs, so only one block's matrices are held at once.
+    """
+    graph = link_graph(corpus)
+    index = {page: i for i, page in enumerate(graph.pages)}
+    teleports = [teleport if isinstance(teleport, dict)
+                 else dict.fromkeys(teleport, 1) for teleport in teleports]
+    for teleport in teleports:
+        check_teleport(teleport, index)
+    size = max(1, BATCH_ENTRIES // max(len(graph.pages), 1))
+
+    results = []
+    for first in range(0, len(teleports), size):
+        ranks = batch_power_iteration(
+            graph, damping_factor,
+            teleport_matrix(graph, teleports[first:first + size], index),
+            tolerance
+        )
+        for column in ranks.T:
+            if top is None:
+                results.append(dict(zip(graph.pages, column.tolist())))
+                continue
+            best = numpy.argsort(-column, kind="stable")[:top]
+            results.append(
+                {graph.pages[i]: float(column[i]) for i in best.tolist()}
+            )
+    return results
+
+
+def check_teleport(teleport, index):
+    """
+    Raise ValueError unless a teleport dictionary only has pages in
+    `index`, non-negative weights, and some positive weight.
+    """
+    for page in teleport:
+        if page not in index:
+            raise ValueError(f"Unknown teleport page: {page}")
+    weights = teleport.values()
+    if any(weight < 0 for weight in weights) or sum(weights) <= 0:
+        raise ValueError("Teleport weights must be non-negative and not all 0")
+
+
+def teleport_matrix(graph, teleports, index):
+    """
+    Return a matrix with one column per teleport dictionary over the
+    pages of a Graph, each column summing to 1, given the `index` of
+    each page in the Graph.
+    """
+    matrix = numpy.zeros((len(graph.pages), len(teleports)))
+    for column, teleport in enumerate(teleports):
+        for page, weight in teleport.items():
+            matrix[index[page], column] += weight
+    return matrix / matrix.sum(axis=0)
+
+
+def batch_power_iteration(graph, damping_factor, teleport,
+                          tolerance=TOLERANCE):
+    """
+    Return a matrix with the PageRank vector of a Graph for each column
+    of a teleport matrix, by power iteration on all the columns at once.
+
+    Following the links is one bincount per column, while the rank of
+    pages with no links, the teleport term and the convergence test are
+    shared by all the columns. Columns stop being updated once they
+    change by less than `tolerance` in total (L1 distance) between two
+    iterations.
+    """
+    n = len(graph.pages)
+    degrees = numpy.diff(graph.offsets)
+    sources = numpy.repeat(numpy.arange(n), degrees)
+    dangling = numpy.flatnonzero(degrees == 0)
+    degrees = numpy.maximum(degrees, 1)
+
+    # Unconverged columns are kept together, one per row of `ranks` and
+    # `teleport`, and copied out to `results` as they converge
+    results = numpy.empty(teleport.shape)
+    columns = numpy.arange(teleport.shape[1])
+    teleport = teleport.T.copy()
+    ranks = teleport.copy()
+    while len(columns):
+        shares = ranks / degrees
+        new_ranks = numpy.empty(ranks.shape)
+        for row, column_shares in enumerate(shares):
+            new_ranks[row] = numpy.bincount(
+                graph.targets, weights=column_shares[sources], minlength=n
+            )
+        new_ranks *= damping_factor
+        new_ranks += ((1 - damping_factor)
+                      + damping_factor * ranks[:, dangling].sum(axis=1)
+                      )[:, None] * teleport
+        change = numpy.abs(new_ranks - ranks).sum(axis=1)
+        ranks = new_ranks
+
+        converged = change < tolerance
+        if converged.any():
+            results[:, columns[converged]] = ranks[converged].T
+            columns = columns[~converged]
+            ranks = ranks[~converged]
+            teleport = teleport[~converged]
+
+    return results
 
 
 if __name__ == "__main__":